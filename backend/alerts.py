@@ -0,0 +1,259 @@
+import atexit
+import queue
+import smtplib
+import threading
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from time import monotonic
+
+import metrics
+from blacklist_index import normalize_plate
+from config import (ALERT_DEDUPE_SECONDS, ALERT_DIGEST_WINDOW, ALERT_DIGEST_THRESHOLD,
+                    ALERT_SMTP_IDLE_TIMEOUT, ALERT_QUEUE_SIZE)
+
+# Import email configuration
+try:
+    from email_config import (EMAIL_SENDER, EMAIL_PASSWORD, EMAIL_RECEIVER, SMTP_SERVER, SMTP_PORT,
+                              SMTP_STARTTLS, EMAIL_ENABLED)
+except ImportError:
+    # Fallback to environment variables if config file doesn't exist
+    import os
+    EMAIL_SENDER = os.getenv('EMAIL_SENDER')
+    EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
+    EMAIL_RECEIVER = os.getenv('EMAIL_RECEIVER')
+    SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
+    SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+    SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+    EMAIL_ENABLED = os.getenv('EMAIL_ENABLED', 'true').lower() == 'true'
+
+
+class AlertDispatcher:
+    """Sends violation e-mails from a background thread over one reused SMTP session.
+
+    ``send`` only enqueues, so a slow mail server never stalls the frame loop.
+    Repeat alerts for the same plate and status within ``dedupe_window``
+    seconds are dropped. After the first alert of a burst the worker waits
+    ``digest_window`` seconds for more; ``digest_threshold`` or more pending
+    alerts go out as a single digest e-mail. The SMTP session is closed after
+    ``idle_timeout`` seconds without alerts and reopened on the next one.
+    """
+
+    def __init__(self, sender, receiver, server, port, password=None, starttls=True,
+                 dedupe_window=300.0, digest_window=2.0, digest_threshold=3, idle_timeout=60.0,
+                 queue_size=1000, max_retries=2):
+        self.sender = sender
+        self.receiver = receiver
+        self.server = server
+        self.port = port
+        self.password = password
+        self.starttls = starttls
+        self.dedupe_window = dedupe_window
+        self.digest_window = digest_window
+        self.digest_threshold = max(2, digest_threshold)
+        self.idle_timeout = idle_timeout
+        self.max_retries = max_retries
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.last_sent = {}  # (plate, status) -> monotonic time of the last accepted alert
+        self.lock = threading.Lock()
+        self.smtp = None
+        self.alerts_queued = 0
+        self.alerts_deduped = 0
+        self.alerts_dropped = 0
+        self.alerts_failed = 0
+        self.emails_sent = 0
+        self.digests_sent = 0
+        self.connections = 0
+        self.thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self.thread.start()
+
+    def send(self, numberplate, speed, status):
+        """Queue an alert; returns False if it was a duplicate or the queue is full."""
+        now = monotonic()
+        key = (normalize_plate(numberplate), status)
+        with self.lock:
+            last = self.last_sent.get(key)
+            if last is not None and now - last < self.dedupe_window:
+                self.alerts_deduped += 1
+                metrics.ALERTS.labels("deduped").inc()
+                return False
+            self.last_sent[key] = now
+            # Forget plates outside the window so the map does not grow without bound
+            if len(self.last_sent) > 10000:
+                self.last_sent = {k: t for k, t in self.last_sent.items() if now - t < self.dedupe_window}
+        try:
+            self.queue.put_nowait({
+                "numberplate": numberplate,
+                "speed": speed,
+                "status": status,
+                "time": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+        except queue.Full:
+            self.alerts_dropped += 1
+            metrics.ALERTS.labels("dropped").inc()
+            print(f"Alert queue full, dropping alert for {numberplate}")
+            return False
+        self.alerts_queued += 1
+        metrics.ALERTS.labels("queued").inc()
+        return True
+
+    def flush(self, timeout=None):
+        """Block until every alert queued before this call has been handled."""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        self.flush(timeout)
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "alerts_queued": self.alerts_queued,
+            "alerts_deduped": self.alerts_deduped,
+            "alerts_dropped": self.alerts_dropped,
+            "alerts_failed": self.alerts_failed,
+            "emails_sent": self.emails_sent,
+            "digests_sent": self.digests_sent,
+            "smtp_connections": self.connections
+        }
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_timeout if self.smtp else None)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            if item is None:
+                self._disconnect()
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+
+            # Collect the rest of a burst
+            alerts, markers, stop = [item], [], False
+            deadline = monotonic() + self.digest_window
+            while True:
+                try:
+                    more = self.queue.get(timeout=max(0.0, deadline - monotonic()))
+                except queue.Empty:
+                    break
+                if more is None:
+                    stop = True
+                    break
+                if isinstance(more, threading.Event):
+                    markers.append(more)  # A flush ends the wait for more alerts
+                    break
+                alerts.append(more)
+
+            if len(alerts) >= self.digest_threshold:
+                self._deliver(self._digest(alerts), len(alerts), digest=True)
+            else:
+                for alert in alerts:
+                    self._deliver(self._message(alert), 1)
+            for marker in markers:
+                marker.set()
+            if stop:
+                self._disconnect()
+                return
+
+    def _message(self, alert):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = self.receiver
+        msg['Subject'] = f"Vehicle Violation Alert: {alert['status']}"
+
+        body = f"""
+        A vehicle violation has been detected:
+        Number Plate: {alert['numberplate']}
+        Speed: {alert['speed']} km/h
+        Status: {alert['status']}
+        Time: {alert['time']}
+        """
+        msg.attach(MIMEText(body, 'plain'))
+        return msg
+
+    def _digest(self, alerts):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = self.receiver
+        msg['Subject'] = f"Vehicle Violation Alerts: {len(alerts)} violations"
+
+        lines = [f"{alert['time']} | {alert['numberplate']} | {alert['speed']} km/h | {alert['status']}"
+                 for alert in alerts]
+        body = f"{len(alerts)} vehicle violations have been detected:\n\n" + "\n".join(lines) + "\n"
+        msg.attach(MIMEText(body, 'plain'))
+        return msg
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=30)
+        if self.starttls:
+            smtp.starttls()
+        if self.password:
+            smtp.login(self.sender, self.password)
+        self.smtp = smtp
+        self.connections += 1
+
+    def _disconnect(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self.smtp = None
+
+    def _deliver(self, msg, count, digest=False):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.smtp is None:
+                    self._connect()
+                self.smtp.sendmail(self.sender, self.receiver, msg.as_string())
+                self.emails_sent += 1
+                metrics.ALERTS.labels("sent").inc(count)
+                if digest:
+                    self.digests_sent += 1
+                print(f"Email sent: {msg['Subject']}")
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"Failed to send email (attempt {attempt + 1}): {str(e)}")
+                # The server may have dropped the session; reconnect on the next attempt
+                self._disconnect()
+        self.alerts_failed += count
+        metrics.ALERTS.labels("failed").inc(count)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Return the process-wide alert dispatcher, starting it on first use."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher(
+                EMAIL_SENDER, EMAIL_RECEIVER, SMTP_SERVER, SMTP_PORT,
+                password=EMAIL_PASSWORD,
+                starttls=SMTP_STARTTLS,
+                dedupe_window=ALERT_DEDUPE_SECONDS,
+                digest_window=ALERT_DIGEST_WINDOW,
+                digest_threshold=ALERT_DIGEST_THRESHOLD,
+                idle_timeout=ALERT_SMTP_IDLE_TIMEOUT,
+                queue_size=ALERT_QUEUE_SIZE
+            )
+            atexit.register(_dispatcher.close)
+            metrics.ALERT_QUEUE.set_function(_dispatcher.queue.qsize)
+        return _dispatcher
+
+
+def send_violation_email(numberplate, speed, status):
+    """Queue an email notification for a blacklisted or overspeeding vehicle."""
+    if not EMAIL_ENABLED:
+        print("Email notifications are disabled")
+        return
+    get_dispatcher().send(numberplate, speed, status)
@@ -1,15 +1,42 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Request, Response, stream_with_context, request, jsonify, render_template, send_from_directory
 from flask_cors import CORS
 import os
+import uuid
+import logging
 import cv2
-import numpy as np
 import mysql.connector
-from main import SpeedEstimator  # Import SpeedEstimator from main.py
+from main import SpeedEstimator, get_threshold_speed, load_blacklist  # Import SpeedEstimator from main.py
+import db
+import models
+from jobs import JobManager
+from result_cache import HashingFile, ResultCache, UploadStore, store_upload
+from blacklist_index import blacklist
+from cache import settings, stats_cache
+import rollups
+import detections
+import migrations
+import config
+import metrics
+from db_writer import get_writer
+from alerts import get_dispatcher
+from video_pipeline import run_sequential, run_pipelined
+from summary import DetectionSummary, speed_drift
+from sharding import process_sharded
+from stream import StreamManager
+from config import (JOB_WORKERS, JOB_HISTORY_LIMIT, PRELOAD_MODELS, PIPELINE_ENABLED, PIPELINE_QUEUE_SIZE,
+                    FRAME_STRIDE, ROI_MARGIN, DEFAULT_METERS_PER_PIXEL, CAMERA_CALIBRATION,
+                    SHARD_OVERLAP_SECONDS, STREAM_SOURCES, STREAM_MAX_STREAMS, STREAM_JPEG_QUALITY,
+                    STREAM_RECONNECT_DELAY, RESULT_CACHE_ENABLED, RESULT_CACHE_MAX_MB,
+                    UPLOAD_CACHE_MAX_MB,
+                    LOG_LEVEL)
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
@@ -19,11 +46,49 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULT_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
+
+class UploadRequest(Request):
+    """Streams uploaded files straight into the upload folder, hashing them as they arrive."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFile(UPLOAD_FOLDER)
+
+
+app.request_class = UploadRequest
+
+# Finished results by upload hash and options, capped in size
+result_cache = ResultCache(RESULT_FOLDER, RESULT_CACHE_MAX_MB * 1024 * 1024)
+upload_store = UploadStore(UPLOAD_FOLDER, UPLOAD_CACHE_MAX_MB * 1024 * 1024)
+
+# Settings besides the per-job options that change a processed video or its detections
+RESULT_SETTINGS = ("SPEED_WINDOW", "TRACK_TTL_FRAMES", "OCR_CONFIRM_VOTES", "OCR_CONFIRM_CONFIDENCE",
+                   "OCR_MIN_READS", "OCR_MAX_READS", "OCR_RETRY_INTERVAL", "OCR_CACHE_TTL_FRAMES",
+                   "OCR_BATCH_MAX_WAIT", "PLATE_LOCALIZATION", "PLATE_MODEL_PATH", "PLATE_CROP_HEIGHT",
+                   "PLATE_FALLBACK", "PLATE_FALLBACK_CONFIDENCE", "BLACKLIST_FUZZY")
+
 # Load YOLO model
 model_path = "models/best.pt"
 
-def generate_output_video(input_video_path):
-    """Processes video and saves the output with detections and speed estimations."""
+# Speed measurement line
+REGION = [(0, 145), (1018, 145)]
+
+def generate_output_video(input_video_path, output_path=None, progress_callback=None,
+                          stride=1, roi=None, summary=None, meters_per_pixel=DEFAULT_METERS_PER_PIXEL):
+    """Processes video and saves the output with detections and speed estimations.
+
+    ``progress_callback(frames_done, total_frames)`` is called after every frame.
+    ``stride`` and ``roi`` reduce inference work (see video_pipeline.infer_frames
+    and SpeedEstimator.extract_tracks); ``summary`` collects per-vehicle results.
+    ``meters_per_pixel`` is the camera calibration used for speeds.
+    """
+    if output_path is None:
+        output_path = os.path.join(RESULT_FOLDER, f"output_{uuid.uuid4().hex}.mp4")
+    return process_video(input_video_path, output_path, progress_callback, stride, roi, summary,
+                         meters_per_pixel=meters_per_pixel)
+
+def process_video(input_video_path, output_path, progress_callback=None, stride=1, roi=None,
+                  summary=None, record=True, meters_per_pixel=DEFAULT_METERS_PER_PIXEL):
+    """Run the estimator over a video; with ``output_path=None`` no video is written."""
     cap = cv2.VideoCapture(input_video_path)
     if not cap.isOpened():
         print("Error: Unable to open video file.")
@@ -32,48 +97,187 @@ def generate_output_video(input_video_path):
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30  # Set default FPS if unavailable
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    out_writer = None
+    if output_path is not None:
+        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+        out_writer = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
+
+    estimator = SpeedEstimator(
+        region=REGION,
+        model=model_path,
+        detector=models.detector_for_job(model_path),  # Own network and tracker while the job runs
+        ocr=models.get_ocr(),
+        roi=roi,
+        record=record,
+        fps=cap.get(cv2.CAP_PROP_FPS) or 30.0,  # Exact source rate for speeds, e.g. 29.97
+        meters_per_pixel=meters_per_pixel,
+        line_width=2
+    )
 
-    output_path = os.path.join(RESULT_FOLDER, "output.mp4")
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    out_writer = cv2.VideoWriter(output_path, fourcc, fps, (frame_width, frame_height))
-
-    estimator = SpeedEstimator(region=[(0, 145), (1018, 145)], model=model_path, line_width=2)
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        detection_results = estimator.estimate_speed(frame)
-        processed_frame = estimator.annotator.result()
-
-        if processed_frame is not None and isinstance(processed_frame, np.ndarray):
-            out_writer.write(processed_frame)
+    try:
+        if PIPELINE_ENABLED:
+            run_pipelined(cap, out_writer, estimator, progress_callback=progress_callback,
+                          total_frames=total_frames, queue_size=PIPELINE_QUEUE_SIZE,
+                          stride=stride, summary=summary)
+        else:
+            run_sequential(cap, out_writer, estimator, progress_callback=progress_callback,
+                           total_frames=total_frames, stride=stride, summary=summary)
+        estimator.finish()
+    finally:
+        estimator.release()
+        cap.release()
+        if out_writer is not None:
+            out_writer.release()
 
-    cap.release()
-    out_writer.release()
     return output_path
 
+def process_job(job):
+    """Job pool entry point: each job writes its own result file, named by its cache key."""
+    name = job.key or job.id
+    output_path = os.path.join(RESULT_FOLDER, f"{name}.mp4")
+    stride = job.options.get("stride", 1)
+    roi = job.options.get("roi")
+    meters_per_pixel = job.options.get("meters_per_pixel", DEFAULT_METERS_PER_PIXEL)
+    summary = DetectionSummary()
+    if job.options.get("shards", 1) > 1:
+        result_path = process_sharded(job.input_path, output_path, model_path, REGION, job.options["shards"],
+                                      SHARD_OVERLAP_SECONDS, stride=stride, roi=roi,
+                                      meters_per_pixel=meters_per_pixel, summary=summary,
+                                      progress_callback=job.update_progress)
+    else:
+        result_path = generate_output_video(job.input_path, output_path, progress_callback=job.update_progress,
+                                            stride=stride, roi=roi, summary=summary,
+                                            meters_per_pixel=meters_per_pixel)
+    job.summary = summary.to_dict()
+
+    if result_path and job.options.get("drift_check") and (stride > 1 or roi):
+        # Full-rate, full-frame pass without video output or database writes as reference
+        baseline = DetectionSummary()
+        process_video(job.input_path, None, summary=baseline, record=False, meters_per_pixel=meters_per_pixel)
+        job.drift = speed_drift(baseline, summary)
+
+    if result_path and job.key:
+        result_cache.put(job.key, result_path, keep=job_manager.active_keys(), summary=job.summary,
+                         drift=job.drift, options=job.options)
+    else:
+        result_cache.evict(keep=job_manager.active_keys())
+    return result_path
+
+def result_settings():
+    """Everything besides the upload and its options that a cached result depends on.
+
+    Covers the current speed threshold and blacklist, which change at runtime
+    through /threshold and /blacklist, so a change makes earlier results miss.
+    """
+    blacklist.refresh_if_stale(load_blacklist)
+    return {
+        "model": model_path,
+        "region": REGION,
+        "threshold_speed": settings.get("threshold_speed", get_threshold_speed),
+        "blacklist": blacklist.digest,
+        **{name: getattr(config, name) for name in RESULT_SETTINGS}
+    }
+
+def roi_around_line(region, margin):
+    """Bounding box of the measurement line grown by ``margin`` pixels."""
+    xs = [x for x, _ in region]
+    ys = [y for _, y in region]
+    return (min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin)
+
+def parse_processing_options(form):
+    """Per-job options from the /upload form; raises ValueError on invalid values."""
+    stride = int(form.get("stride", FRAME_STRIDE))
+    if stride < 1:
+        raise ValueError("stride must be at least 1")
+
+    roi = None
+    if form.get("roi"):
+        roi = tuple(int(value) for value in form["roi"].split(","))
+        if len(roi) != 4 or roi[2] <= roi[0] or roi[3] <= roi[1]:
+            raise ValueError("roi must be x1,y1,x2,y2 with x2 > x1 and y2 > y1")
+    else:
+        margin = int(form.get("roi_margin", ROI_MARGIN))
+        if margin < 0:
+            raise ValueError("roi_margin must not be negative")
+        if margin:
+            roi = roi_around_line(REGION, margin)
+
+    if form.get("camera"):
+        if form["camera"] not in CAMERA_CALIBRATION:
+            raise ValueError(f"no calibration for camera {form['camera']}")
+        meters_per_pixel = float(CAMERA_CALIBRATION[form["camera"]])
+    elif form.get("meters_per_pixel"):
+        meters_per_pixel = float(form["meters_per_pixel"])
+    else:
+        # Speeds, and so violations and alerts, are only as good as this guess
+        print(f"Warning: no camera calibration given, using DEFAULT_METERS_PER_PIXEL={DEFAULT_METERS_PER_PIXEL}")
+        meters_per_pixel = DEFAULT_METERS_PER_PIXEL
+    if meters_per_pixel <= 0:
+        raise ValueError("meters_per_pixel must be positive")
+
+    shards = int(form.get("shards", 1))
+    if not 1 <= shards <= 64:
+        raise ValueError("shards must be between 1 and 64")
+
+    drift_check = form.get("drift_check", "false").lower() in ("1", "true", "yes")
+    return {"stride": stride, "roi": roi, "drift_check": drift_check, "meters_per_pixel": meters_per_pixel,
+            "shards": shards}
+
+def parse_flag(value, name):
+    """JSON boolean, or a form-style "true"/"false"/"1"/"0"/"yes"/"no" string."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("1", "true", "yes", "0", "false", "no"):
+        return value.strip().lower() in ("1", "true", "yes")
+    raise ValueError(f"{name} must be true or false")
+
+def parse_stream_options(data):
+    """Options of a /streams JSON body; raises ValueError on invalid or unsupported values."""
+    unsupported = sorted(set(data) & {"stride", "drift_check", "shards"})
+    if unsupported:
+        raise ValueError(f"{', '.join(unsupported)} not supported for streams")
+
+    # Same rules as the upload form, which sends every value as a string
+    form = {}
+    for name in ("roi", "roi_margin", "camera", "meters_per_pixel"):
+        value = data.get(name)
+        if value is None:
+            continue
+        if name == "roi" and isinstance(value, list):
+            value = ",".join(str(item) for item in value)
+        if isinstance(value, (bool, dict, list)):
+            raise ValueError(f"{name} has the wrong type")
+        form[name] = str(value)
+    if "camera" not in form and data["source"] in CAMERA_CALIBRATION:
+        form["camera"] = data["source"]  # A configured source calibrates itself
+    options = parse_processing_options(form)
+
+    return {"roi": options["roi"], "meters_per_pixel": options["meters_per_pixel"],
+            "record": parse_flag(data.get("record", True), "record"),
+            "replay": parse_flag(data["replay"], "replay") if "replay" in data else None}
+
+job_manager = JobManager(process_job, max_workers=JOB_WORKERS, history_limit=JOB_HISTORY_LIMIT)
+stream_manager = StreamManager(max_streams=STREAM_MAX_STREAMS)
+
+def job_response(job):
+    data = job.to_dict()
+    data["result_video"] = os.path.basename(job.result_path) if job.result_path else None
+    return data
+
 def connect_to_db():
-    try:
-        return mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="nikhil",
-            database="numberplates_speed",
-            port=3306
-        )
-    except mysql.connector.Error as err:
-        print(f"Database connection failed: {err}")
-        return None
+    """Pooled connection; close() returns it to the pool."""
+    return db.get_connection()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/results/<filename>')
+@app.route('/results/<path:filename>')
 def serve_result_video(filename):
-    return send_from_directory(RESULT_FOLDER, filename)
+    # Conditional responses honour Range headers (206 Partial Content) for seeking
+    return send_from_directory(RESULT_FOLDER, filename, conditional=True)
 
 @app.route('/upload', methods=["POST"])
 def upload_video():
@@ -86,25 +290,140 @@ def upload_video():
         if not file or file.filename == '':
             return jsonify({"error": "No selected file"}), 400
 
-        # Save uploaded file
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], file.filename)
-        file.save(file_path)
-        print(f"File saved to: {file_path}")
+        try:
+            options = parse_processing_options(request.form)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid processing options: {e}"}), 400
 
-        # Process video
-        result_path = generate_output_video(file_path)
-        if not result_path:
-            return jsonify({"error": "Video processing failed"}), 500
+        # The upload was streamed to disk and hashed while parsing; keep it under its hash
+        content_hash, file_path = store_upload(file, app.config["UPLOAD_FOLDER"])
+        print(f"File saved to: {file_path}")
+        upload_store.evict(keep={file_path, *job_manager.active_inputs()})
+
+        # Same video, options and settings: return the stored result without reprocessing
+        key, cached = None, None
+        if RESULT_CACHE_ENABLED:
+            key = ResultCache.key(content_hash, options, **result_settings())
+            cached = result_cache.get(key)
+        if cached:
+            return jsonify({
+                "message": "Video already processed",
+                "cached": True,
+                "result_video": cached["result_video"],
+                "summary": cached.get("summary"),
+                "drift": cached.get("drift"),
+                "options": options
+            }), 200
+
+        # Queue video for background processing; an identical upload still in progress is reused
+        job = job_manager.submit(file_path, key=key, **options)
 
         return jsonify({
-            "message": "Video processed successfully",
-            "result_video": result_path
-        })
+            "message": "Video queued for processing",
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}",
+            "options": options
+        }), 202
 
     except Exception as e:
         print(f"Upload error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/jobs', methods=["GET"])
+def list_jobs():
+    return jsonify([job_response(job) for job in job_manager.list()])
+
+@app.route('/jobs/<job_id>', methods=["GET"])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_response(job))
+
+@app.route('/db-writer/stats', methods=["GET"])
+def db_writer_stats():
+    return jsonify(get_writer().stats())
+
+@app.route('/metrics', methods=["GET"])
+def prometheus_metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+@app.route('/result-cache/stats', methods=["GET"])
+def result_cache_stats():
+    return jsonify({**result_cache.stats(), "uploads": upload_store.stats()})
+
+@app.route('/alerts/stats', methods=["GET"])
+def alert_stats():
+    return jsonify(get_dispatcher().stats())
+
+# Live Stream Routes
+@app.route('/streams', methods=["POST"])
+def start_stream():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "JSON object body required"}), 400
+    name = data.get("source")
+    if not isinstance(name, str) or name not in STREAM_SOURCES:
+        return jsonify({"error": "source must be one of the configured stream sources",
+                        "sources": sorted(STREAM_SOURCES)}), 400
+    source = str(STREAM_SOURCES[name])
+
+    try:
+        options = parse_stream_options(data)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid processing options: {e}"}), 400
+
+    # Local files are replayed at their native frame rate unless told otherwise
+    replay = options["replay"] if options["replay"] is not None else os.path.isfile(source)
+    try:
+        stream = stream_manager.start(
+            source, model_path, REGION,
+            replay=replay,
+            roi=options["roi"],
+            record=options["record"],
+            meters_per_pixel=options["meters_per_pixel"],
+            jpeg_quality=STREAM_JPEG_QUALITY,
+            reconnect_delay=STREAM_RECONNECT_DELAY
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 429
+
+    data = stream.to_dict()
+    data["mjpeg_url"] = f"/streams/{stream.id}/mjpeg"
+    return jsonify(data), 201
+
+@app.route('/streams', methods=["GET"])
+def list_streams():
+    return jsonify([stream.to_dict() for stream in stream_manager.list()])
+
+@app.route('/streams/<stream_id>', methods=["GET"])
+def get_stream(stream_id):
+    stream = stream_manager.get(stream_id)
+    if not stream:
+        return jsonify({"error": "Stream not found"}), 404
+    return jsonify(stream.to_dict())
+
+@app.route('/streams/<stream_id>', methods=["DELETE"])
+def stop_stream(stream_id):
+    stream = stream_manager.stop(stream_id)
+    if not stream:
+        return jsonify({"error": "Stream not found"}), 404
+    return jsonify(stream.to_dict())
+
+@app.route('/streams/<stream_id>/mjpeg', methods=["GET"])
+def stream_mjpeg(stream_id):
+    stream = stream_manager.get(stream_id)
+    if not stream:
+        return jsonify({"error": "Stream not found"}), 404
+
+    def generate():
+        for jpeg in stream.frames():
+            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+    return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
+
 # Blacklist Management Routes
 @app.route('/blacklist', methods=["POST"])
 def manage_blacklist():
@@ -121,24 +440,26 @@ def manage_blacklist():
 
 def add_to_blacklist(numberplate):
     try:
-        estimator = SpeedEstimator()  # Initialize if needed
-        db_connection = estimator.connect_to_db()
-        cursor = db_connection.cursor()
-        query = "INSERT INTO blacklisted_vehicles (numberplate, reason) VALUES (%s, %s)"
-        cursor.execute(query, (numberplate, "Added via API"))
-        db_connection.commit()
+        with db.connection() as db_connection:
+            cursor = db_connection.cursor()
+            query = "INSERT INTO blacklisted_vehicles (numberplate, reason) VALUES (%s, %s)"
+            cursor.execute(query, (numberplate, "Added via API"))
+            db_connection.commit()
+            cursor.close()
+        blacklist.add(numberplate)
         return jsonify({"message": f"{numberplate} added to blacklist"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 def remove_from_blacklist(numberplate):
     try:
-        estimator = SpeedEstimator()  # Initialize if needed
-        db_connection = estimator.connect_to_db()
-        cursor = db_connection.cursor()
-        query = "DELETE FROM blacklisted_vehicles WHERE numberplate = %s"
-        cursor.execute(query, (numberplate,))
-        db_connection.commit()
+        with db.connection() as db_connection:
+            cursor = db_connection.cursor()
+            query = "DELETE FROM blacklisted_vehicles WHERE numberplate = %s"
+            cursor.execute(query, (numberplate,))
+            db_connection.commit()
+            cursor.close()
+        blacklist.discard(numberplate)
         return jsonify({"message": f"{numberplate} removed from blacklist"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -173,6 +494,7 @@ def set_threshold():
         # Update threshold
         cursor.execute("UPDATE settings SET threshold_speed = %s WHERE id = 1", (float(threshold),))
         conn.commit()
+        settings.invalidate("threshold_speed")
         
         return jsonify({"message": f"Threshold updated to {threshold} km/h"})
         
@@ -185,66 +507,62 @@ def set_threshold():
         print(f"Unexpected error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
     finally:
-        if 'conn' in locals() and conn and conn.is_connected():
-            cursor.close()
-            conn.close()
+        if 'conn' in locals() and conn:
+            if 'cursor' in locals():
+                cursor.close()
+            conn.close()  # Returns the connection to the pool
 
 # New Route for Analytics Dashboard
 @app.route('/stats', methods=['GET'])
 def get_stats():
     try:
-        conn = connect_to_db()
-        if not conn:
-            return jsonify({"error": "Database connection failed"}), 500
-
-        cursor = conn.cursor(dictionary=True)
-
-        # Total vehicles processed
-        cursor.execute("SELECT COUNT(*) as total_vehicles FROM my_data")
-        total_vehicles = cursor.fetchone()['total_vehicles']
-
-        # Average speed
-        cursor.execute("SELECT AVG(speed) as average_speed FROM my_data")
-        avg_speed_result = cursor.fetchone()['average_speed']
-        average_speed = round(avg_speed_result, 2) if avg_speed_result else 0.0
-
-        # Number of overspeeding vehicles
-        cursor.execute("SELECT COUNT(*) as overspeeding FROM my_data WHERE status = 'OVER SPEED'")
-        overspeeding = cursor.fetchone()['overspeeding']
-
-        # Number of blacklisted vehicles
-        cursor.execute("SELECT COUNT(*) as blacklisted FROM my_data WHERE status = 'BLACKLISTED'")
-        blacklisted = cursor.fetchone()['blacklisted']
-
-        # Top 5 violators
-        cursor.execute("""
-            SELECT numberplate, COUNT(*) as violation_count 
-            FROM my_data 
-            WHERE status IN ('OVER SPEED', 'BLACKLISTED') 
-            GROUP BY numberplate 
-            ORDER BY violation_count DESC 
-            LIMIT 5
-        """)
-        top_violators = cursor.fetchall()
-
-        return jsonify({
-            "total_vehicles": total_vehicles,
-            "average_speed": average_speed,
-            "overspeeding": overspeeding,
-            "blacklisted": blacklisted,
-            "top_violators": top_violators
-        })
-
+        return jsonify(stats_cache.get("stats", load_stats))
     except mysql.connector.Error as err:
         print(f"MySQL Error: {err}")
         return jsonify({"error": "Database operation failed"}), 500
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
-    finally:
-        if 'conn' in locals() and conn and conn.is_connected():
-            cursor.close()
-            conn.close()
+
+def load_stats():
+    """Totals from the rollup tables maintained by the detection writer."""
+    with metrics.DB_SECONDS.labels("stats").time(), db.connection() as conn:
+        return rollups.load_stats(conn)
+
+# Detection History Route
+@app.route('/detections', methods=['GET'])
+def list_detections():
+    try:
+        filters = detections.parse_filters(request.args)
+        after = int(request.args["cursor"]) if request.args.get("cursor") else None
+        output = request.args.get("format", "json")
+        if output not in ("json", "ndjson", "csv"):
+            raise ValueError("format must be json, ndjson or csv")
+        limit = request.args.get("limit")
+        limit = int(limit) if limit else None
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+
+    try:
+        if output == "json":
+            limit = min(limit or 100, 1000)
+            rows = detections.fetch_page(filters, after, limit)
+            return jsonify({
+                "detections": rows,
+                "next_cursor": rows[-1]["id"] if len(rows) == limit else None
+            })
+
+        # Exports stream every matching row (or ``limit`` rows) a page at a time
+        rows = detections.iter_rows(filters, after, limit)
+        if output == "ndjson":
+            return Response(stream_with_context(detections.ndjson_lines(rows)), mimetype="application/x-ndjson")
+        return Response(stream_with_context(detections.csv_lines(rows)), mimetype="text/csv",
+                        headers={"Content-Disposition": "attachment; filename=detections.csv"})
+    except mysql.connector.Error as err:
+        print(f"MySQL Error: {err}")
+        return jsonify({"error": "Database operation failed"}), 500
 
 # Email Configuration Route
 @app.route('/email-config', methods=['POST'])
@@ -296,9 +614,19 @@ def set_email_config():
         print(f"Unexpected error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
     finally:
-        if 'conn' in locals() and conn and conn.is_connected():
-            cursor.close()
-            conn.close()
+        if 'conn' in locals() and conn:
+            if 'cursor' in locals():
+                cursor.close()
+            conn.close()  # Returns the connection to the pool
 
 if __name__ == "__main__":
+    # Tables and indexes are created here, never inside a request or a writer flush
+    try:
+        migrations.migrate()
+    except Exception as e:
+        print(f"Schema migration failed: {str(e)}")
+    # With the debug reloader only the child process serves requests
+    if PRELOAD_MODELS and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        timings = models.preload(model_path)
+        print("Models preloaded: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
     app.run(debug=True)
\ No newline at end of file
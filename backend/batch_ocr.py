@@ -0,0 +1,123 @@
+from time import time
+
+import numpy as np
+
+import metrics
+
+
+class BatchedOCR:
+    """Collects plate crops and recognises them in batches with PaddleOCR.
+
+    Text detection in PaddleOCR runs one image at a time, so each crop still
+    gets its own detection pass, but every text line found across all pending
+    crops goes through the angle classifier and recogniser in a single call.
+    Crops are flushed once ``batch_size`` are pending or the oldest one has
+    waited ``max_wait`` seconds; with ``max_wait=0`` every poll flushes, which
+    batches all detections of one frame. A positive ``max_wait`` lets batches
+    span several frames, so crops are copied on submit.
+
+    Plates already cut into text lines (see ``PlateLocator``) are submitted
+    with ``submit_lines`` and skip text detection altogether. When their read
+    is empty or below ``fallback_confidence``, the ``fallback`` crop given
+    with them is recognised in the same flush and the better read is kept.
+    """
+
+    def __init__(self, ocr, batch_size=16, max_wait=0.0, fallback_confidence=0.0):
+        self.ocr = ocr
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.fallback_confidence = fallback_confidence
+        self.fallbacks = 0  # Localised reads retried on their fallback crop
+        self.pending = []  # (key, crop or list of lines, submitted_at, fallback crop or None)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def submit(self, key, crop):
+        if not isinstance(crop, np.ndarray) or not crop.size:
+            return
+        if self.max_wait > 0:
+            crop = crop.copy()  # The frame is annotated in place before a deferred flush
+        self.pending.append((key, crop, time(), None))
+
+    def submit_lines(self, key, lines, fallback=None):
+        """Queue text lines of an already localised plate, and the crop to read instead if they read poorly.
+
+        The lines are new arrays, so they are never copied.
+        """
+        if not lines:
+            return
+        if not isinstance(fallback, np.ndarray) or not fallback.size:
+            fallback = None
+        elif self.max_wait > 0:
+            fallback = fallback.copy()
+        self.pending.append((key, list(lines), time(), fallback))
+
+    def ready(self):
+        if not self.pending:
+            return False
+        if len(self.pending) >= self.batch_size:
+            return True
+        return time() - self.pending[0][2] >= self.max_wait
+
+    def poll(self):
+        """Flush if a batch is ready; returns {key: (text, confidence)}."""
+        return self.flush() if self.ready() else {}
+
+    def flush(self):
+        """Recognise every pending crop; returns {key: (text, confidence)}."""
+        if not self.pending:
+            return {}
+        pending, self.pending = self.pending, []
+        reads = self.recognize([crop for _, crop, _, _ in pending])
+
+        # Localised plates that read poorly get a second chance on the whole crop
+        weak = [idx for idx, ((_, _, _, fallback), (text, confidence)) in enumerate(zip(pending, reads))
+                if fallback is not None and (not text or confidence < self.fallback_confidence)]
+        if weak:
+            metrics.PLATES_LOCATED.labels("weak_read").inc(len(weak))
+            self.fallbacks += len(weak)
+            retried = self.recognize([pending[idx][3] for idx in weak])
+            for idx, read in zip(weak, retried):
+                if read[0] and (not reads[idx][0] or read[1] > reads[idx][1]):
+                    reads[idx] = read
+        return {key: read for (key, _, _, _), read in zip(pending, reads)}
+
+    def recognize(self, crops):
+        """Return one (text, confidence) per crop or list of lines, lines joined top to bottom."""
+        metrics.OCR_CALLS.inc()
+        metrics.OCR_CROPS.inc(len(crops))
+        with metrics.OCR.time():
+            return self._recognize(crops)
+
+    def _recognize(self, crops):
+        lines, owners = [], []
+        for idx, crop in enumerate(crops):
+            if isinstance(crop, list):
+                lines.extend(crop)
+                owners.extend([idx] * len(crop))
+                continue
+            detected = self.ocr.ocr(crop, det=True, rec=False, cls=False)
+            if not detected or not detected[0]:
+                continue
+            for box in sorted(detected[0], key=lambda b: (b[0][1], b[0][0])):
+                points = np.array(box)
+                x0, y0 = np.maximum(np.floor(points.min(axis=0)).astype(int), 0)
+                x1, y1 = np.ceil(points.max(axis=0)).astype(int)
+                line = crop[y0:y1, x0:x1]
+                if line.size:
+                    lines.append(line)
+                    owners.append(idx)
+
+        texts = [[] for _ in crops]
+        scores = [[] for _ in crops]
+        if lines:
+            use_cls = getattr(self.ocr, "use_angle_cls", False)
+            recognized = self.ocr.ocr(lines, det=False, rec=True, cls=use_cls)[0]
+            drop_score = getattr(self.ocr, "drop_score", 0.5)
+            for owner, (text, score) in zip(owners, recognized):
+                if score >= drop_score:
+                    texts[owner].append(text)
+                    scores[owner].append(score)
+
+        return [(' '.join(t), float(min(s))) if t else ("", 0.0) for t, s in zip(texts, scores)]
@@ -0,0 +1,66 @@
+"""Alert dispatcher against a local stub SMTP server (aiosmtpd).
+
+Queues a burst of violations, some of them repeats, and reports how long
+``send`` blocked the caller, how many e-mails and digests the stub received
+and how many SMTP sessions were opened. ``--delay`` makes the stub answer
+slowly, like a congested mail server. Run from the backend directory:
+
+    pip install aiosmtpd
+    python -m benchmarks.alert_dispatch --alerts 50 --plates 20 --delay 0.2
+"""
+import argparse
+import asyncio
+import json
+from time import perf_counter
+
+from aiosmtpd.controller import Controller
+
+from alerts import AlertDispatcher
+
+
+class StubHandler:
+    def __init__(self, delay):
+        self.delay = delay
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.delay)
+        self.messages.append(envelope.content.decode("utf8", errors="replace"))
+        return "250 Message accepted for delivery"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=50)
+    parser.add_argument("--plates", type=int, default=20, help="distinct plates among the alerts")
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds the stub takes per message")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = StubHandler(args.delay)
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        dispatcher = AlertDispatcher("alerts@example.com", "ops@example.com", "127.0.0.1", args.port,
+                                     starttls=False, dedupe_window=60, digest_window=0.5)
+        enqueue_times = []
+        for index in range(args.alerts):
+            start = perf_counter()
+            dispatcher.send(f"KA01AB{index % args.plates:04d}", 80 + index % 10, "OVER SPEED")
+            enqueue_times.append(perf_counter() - start)
+        start = perf_counter()
+        dispatcher.close(timeout=60)
+        drain = perf_counter() - start
+    finally:
+        controller.stop()
+
+    print(json.dumps({
+        "max_enqueue_ms": round(max(enqueue_times) * 1000, 3),
+        "drain_s": round(drain, 3),
+        "messages_received": len(handler.messages),
+        **dispatcher.stats()
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
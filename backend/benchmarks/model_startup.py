@@ -0,0 +1,68 @@
+"""Startup time and first-frame latency with and without the shared model registry.
+
+"before" builds a SpeedEstimator that loads YOLO and PaddleOCR itself, as every
+job used to. "after" preloads once through models.py and then builds estimators
+from the detector pool and the shared OCR; jobs run one after another, so each
+reuses the warmed-up detector the previous one released. Run from the backend directory:
+
+    python -m benchmarks.model_startup --video sample2.mp4 --jobs 3
+"""
+import argparse
+import json
+from time import perf_counter
+
+import cv2
+
+import models
+from main import SpeedEstimator
+
+REGION = [(0, 145), (1018, 145)]
+
+
+def first_frame(video_path):
+    cap = cv2.VideoCapture(video_path)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        raise SystemExit(f"Unable to read {video_path}")
+    return frame
+
+
+def run_job(frame, build):
+    start = perf_counter()
+    estimator = build()
+    startup = perf_counter() - start
+    start = perf_counter()
+    estimator.estimate_speed(frame.copy())
+    first_frame = perf_counter() - start
+    estimator.release()  # The next job reuses the warmed-up detector
+    return {"startup_s": round(startup, 3), "first_frame_s": round(first_frame, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", default="sample2.mp4")
+    parser.add_argument("--model", default="models/best.pt")
+    parser.add_argument("--jobs", type=int, default=3, help="estimators built per mode")
+    args = parser.parse_args()
+
+    frame = first_frame(args.video)
+    results = {"before": [], "after": []}
+    for _ in range(args.jobs):
+        results["before"].append(run_job(
+            frame, lambda: SpeedEstimator(region=REGION, model=args.model, line_width=2)))
+
+    start = perf_counter()
+    timings = models.preload(args.model, frame_size=(frame.shape[1], frame.shape[0]))
+    results["preload_s"] = round(perf_counter() - start, 3)
+    results["preload"] = {name: round(seconds, 3) for name, seconds in timings.items()}
+    for _ in range(args.jobs):
+        results["after"].append(run_job(frame, lambda: SpeedEstimator(
+            region=REGION, model=args.model, detector=models.detector_for_job(args.model),
+            ocr=models.get_ocr(), line_width=2)))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare one-by-one PaddleOCR calls with the batched OCR stage.
+
+Vehicle crops are collected from a clip with the YOLO model and then recognised
+both ways. Run from the backend directory:
+
+    python -m benchmarks.ocr_batching --video sample2.mp4 --batch-sizes 1,8,16,32
+"""
+import argparse
+from time import perf_counter
+
+import cv2
+from paddleocr import PaddleOCR
+from ultralytics import YOLO
+
+from batch_ocr import BatchedOCR
+
+
+def collect_crops(video_path, model_path, max_frames, max_crops):
+    model = YOLO(model_path)
+    cap = cv2.VideoCapture(video_path)
+    crops = []
+    frames = 0
+    while frames < max_frames and len(crops) < max_crops:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames += 1
+        for box in model.predict(frame, verbose=False)[0].boxes.xyxy.cpu().tolist():
+            x1, y1, x2, y2 = map(int, box)
+            crop = frame[y1:y2, x1:x2]
+            if crop.size:
+                crops.append(crop.copy())
+    cap.release()
+    return crops[:max_crops]
+
+
+def time_one_by_one(ocr, crops):
+    start = perf_counter()
+    for crop in crops:
+        ocr.ocr(crop, rec=True)
+    return perf_counter() - start
+
+
+def time_batched(ocr, crops, batch_size):
+    batcher = BatchedOCR(ocr, batch_size=batch_size)
+    start = perf_counter()
+    for offset in range(0, len(crops), batch_size):
+        batcher.recognize(crops[offset:offset + batch_size])
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", default="sample2.mp4")
+    parser.add_argument("--model", default="models/best.pt")
+    parser.add_argument("--frames", type=int, default=200, help="frames scanned for crops")
+    parser.add_argument("--crops", type=int, default=256, help="maximum crops benchmarked")
+    parser.add_argument("--batch-sizes", default="1,4,8,16,32")
+    args = parser.parse_args()
+
+    crops = collect_crops(args.video, args.model, args.frames, args.crops)
+    if not crops:
+        print("No vehicle crops found.")
+        return
+    ocr = PaddleOCR(use_angle_cls=True, lang='en', show_log=False)
+    ocr.ocr(crops[0], rec=True)  # Warm up
+
+    elapsed = time_one_by_one(ocr, crops)
+    baseline = len(crops) / elapsed
+    print(f"{len(crops)} crops")
+    print(f"{'mode':<16}{'crops/sec':>12}{'speedup':>10}")
+    print(f"{'one-by-one':<16}{baseline:>12.1f}{1.0:>10.2f}")
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        rate = len(crops) / time_batched(ocr, crops, batch_size)
+        print(f"{f'batch={batch_size}':<16}{rate:>12.1f}{rate / baseline:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""Per-stage timings, fps, peak RSS and frame latency of the SpeedEstimator pipeline.
+
+Runs ``estimate_speed`` frame by frame and ``generate_output_video`` end to
+end on fixed clips, with MySQL replaced by an in-memory stand-in (optionally
+with a simulated round trip) and SMTP by a local aiosmtpd server when it is
+installed (alerts are disabled otherwise). Results are printed as JSON; pass
+``--output`` to save them and ``--compare`` to diff against a saved run.
+Run from the backend directory:
+
+    python -m benchmarks.pipeline --clips sample2.mp4 --max-frames 300 --output baseline.json
+    python -m benchmarks.pipeline --clips sample2.mp4 --max-frames 300 --compare baseline.json
+
+``estimate_speed`` latency is the time of one call; ``generate_output_video``
+latency is the time between consecutive frames leaving the encoder. Stage
+times are summed over all threads, so with the pipelined mode they can add
+up to more than the wall time.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from time import perf_counter, sleep
+
+import cv2
+import numpy as np
+
+import alerts
+import db
+import db_writer
+import models
+from batch_ocr import BatchedOCR
+from main import SpeedEstimator
+
+REGION = [(0, 145), (1018, 145)]
+STAGES = ("decode", "tracking", "ocr", "db", "annotation", "encode")
+
+
+class StageTimer:
+    """Thread-safe accumulator of call counts and seconds per stage."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = {stage: 0.0 for stage in STAGES}
+        self.calls = {stage: 0 for stage in STAGES}
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.calls[stage] += 1
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, perf_counter() - start)
+        return timed
+
+    def to_dict(self):
+        return {stage: {"seconds": round(self.seconds[stage], 4), "calls": self.calls[stage]} for stage in STAGES}
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.last_query = ""
+
+    def execute(self, query, params=None):
+        self.connection.round_trip()
+        self.last_query = query
+
+    def executemany(self, query, rows):
+        self.connection.round_trip()
+        if "INSERT INTO my_data" in query:
+            self.connection.rows.extend(rows)
+
+    def fetchone(self):
+        if "threshold_speed" in self.last_query:
+            return (50.0,)
+        # Rollup tables and indexes already exist
+        return (1,)
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """In-memory stand-in for a pooled MySQL connection; ``latency`` simulates the round trip."""
+
+    def __init__(self, rows, latency=0.0):
+        self.rows = rows
+        self.latency = latency
+
+    def round_trip(self):
+        if self.latency:
+            sleep(self.latency)
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.round_trip()
+
+    def close(self):
+        pass
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 3) if values else None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@contextmanager
+def patched(obj, name, value):
+    original = getattr(obj, name)
+    setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        setattr(obj, name, original)
+
+
+@contextmanager
+def instrumented(timer):
+    """Time the pipeline stages by wrapping the functions that implement them."""
+    base_capture, base_writer = cv2.VideoCapture, cv2.VideoWriter
+
+    # Wrappers rather than subclasses: OpenCV's types do not survive being subclassed and collected
+    class TimedCapture:
+        def __init__(self, *args):
+            self.cap = base_capture(*args)
+
+        def read(self, *args):
+            start = perf_counter()
+            try:
+                return self.cap.read(*args)
+            finally:
+                timer.add("decode", perf_counter() - start)
+
+        def __getattr__(self, name):
+            return getattr(self.cap, name)
+
+    class TimedWriter:
+        def __init__(self, *args):
+            self.writer = base_writer(*args)
+
+        def write(self, frame):
+            start = perf_counter()
+            try:
+                return self.writer.write(frame)
+            finally:
+                timer.add("encode", perf_counter() - start)
+
+        def __getattr__(self, name):
+            return getattr(self.writer, name)
+
+    with patched(cv2, "VideoCapture", TimedCapture), \
+            patched(cv2, "VideoWriter", TimedWriter), \
+            patched(SpeedEstimator, "extract_tracks", timer.wrap("tracking", SpeedEstimator.extract_tracks)), \
+            patched(BatchedOCR, "recognize", timer.wrap("ocr", BatchedOCR.recognize)), \
+            patched(SpeedEstimator, "annotate", timer.wrap("annotation", SpeedEstimator.annotate)), \
+            patched(db_writer.DetectionWriter, "_flush", timer.wrap("db", db_writer.DetectionWriter._flush)):
+        yield
+
+
+@contextmanager
+def local_services(db_latency):
+    """Route MySQL and SMTP to local stand-ins for the duration of a run."""
+    rows = []
+
+    def connect(timeout=None):
+        return FakeConnection(rows, db_latency)
+
+    smtp = None
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.handlers import Sink
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        smtp = Controller(Sink(), hostname="127.0.0.1", port=port)
+        smtp.start()
+        dispatcher = alerts.AlertDispatcher("alerts@example.com", "ops@example.com", "127.0.0.1", port,
+                                            starttls=False)
+    except ImportError:
+        dispatcher = None
+
+    writer = db_writer.DetectionWriter(connect=connect)
+    try:
+        with patched(db, "get_connection", connect), \
+                patched(db_writer, "_writer", writer), \
+                patched(alerts, "_dispatcher", dispatcher), \
+                patched(alerts, "EMAIL_ENABLED", dispatcher is not None):
+            yield rows
+    finally:
+        writer.close()
+        if dispatcher is not None:
+            dispatcher.close()
+        if smtp is not None:
+            smtp.stop()
+
+
+def trimmed_clip(path, max_frames, directory):
+    """First ``max_frames`` frames of ``path`` as a new file, so every run sees the same input."""
+    if not max_frames:
+        return path
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    clip_path = os.path.join(directory, f"clip_{os.path.basename(path)}")
+    out = cv2.VideoWriter(clip_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for _ in range(max_frames):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        out.write(frame)
+    cap.release()
+    out.release()
+    return clip_path
+
+
+def run_estimate_speed(clip, model_path):
+    timer = StageTimer()
+    latencies = []
+    with instrumented(timer):
+        estimator = SpeedEstimator(region=REGION, model=model_path, detector=models.detector_for_job(model_path),
+                                   ocr=models.get_ocr(), line_width=2)
+        cap = cv2.VideoCapture(clip)
+        start = perf_counter()
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_start = perf_counter()
+            estimator.estimate_speed(frame)
+            latencies.append(perf_counter() - frame_start)
+        estimator.finish()
+        estimator.release()
+        cap.release()
+        elapsed = perf_counter() - start
+    return timer, latencies, elapsed
+
+
+def run_generate_output_video(clip, directory):
+    from app import generate_output_video
+
+    timer = StageTimer()
+    latencies = []
+    last = [None]
+
+    def progress(frames_done, total_frames):
+        now = perf_counter()
+        if last[0] is not None:
+            latencies.append(now - last[0])
+        last[0] = now
+
+    with instrumented(timer):
+        start = perf_counter()
+        last[0] = start
+        generate_output_video(clip, os.path.join(directory, "output.mp4"), progress_callback=progress)
+        elapsed = perf_counter() - start
+    return timer, latencies, elapsed
+
+
+def report(timer, latencies, elapsed, rows):
+    frames = len(latencies)
+    return {
+        "frames": frames,
+        "wall_seconds": round(elapsed, 3),
+        "fps": round(frames / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                       "p99": percentile(latencies, 99)},
+        "stages": timer.to_dict(),
+        "rows_written": len(rows),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Relative change of fps and p95 latency per clip and mode; flags regressions beyond ``tolerance``."""
+    changes, regressions = {}, []
+    for clip, modes in current["results"].items():
+        for mode, result in modes.items():
+            before = baseline.get("results", {}).get(clip, {}).get(mode)
+            if not before:
+                continue
+            fps_change = (result["fps"] - before["fps"]) / before["fps"] if before["fps"] else 0.0
+            p95_before, p95_after = before["latency_ms"]["p95"], result["latency_ms"]["p95"]
+            p95_change = (p95_after - p95_before) / p95_before if p95_before else 0.0
+            changes[f"{clip}:{mode}"] = {"fps": round(fps_change, 4), "p95_latency": round(p95_change, 4)}
+            if fps_change < -tolerance or p95_change > tolerance:
+                regressions.append(f"{clip}:{mode}")
+    return {"changes": changes, "regressions": regressions, "tolerance": tolerance}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", default="sample2.mp4", help="comma-separated video files")
+    parser.add_argument("--model", default="models/best.pt")
+    parser.add_argument("--max-frames", type=int, default=300, help="frames per clip; 0 for the whole clip")
+    parser.add_argument("--modes", default="estimate_speed,generate_output_video")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="seconds per simulated MySQL round trip")
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--compare", help="previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    # Load the models before timing anything
+    preload_timings = models.preload(args.model)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for clip_path in args.clips.split(","):
+            clip = trimmed_clip(clip_path, args.max_frames, directory)
+            results[clip_path] = {}
+            for mode in args.modes.split(","):
+                with local_services(args.db_latency) as rows:
+                    if mode == "estimate_speed":
+                        timer, latencies, elapsed = run_estimate_speed(clip, args.model)
+                    elif mode == "generate_output_video":
+                        timer, latencies, elapsed = run_generate_output_video(clip, directory)
+                    else:
+                        raise SystemExit(f"Unknown mode: {mode}")
+                results[clip_path][mode] = report(timer, latencies, elapsed, rows)
+
+    output = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "options": {"max_frames": args.max_frames, "db_latency": args.db_latency},
+        "preload_seconds": {name: round(seconds, 3) for name, seconds in preload_timings.items()},
+        "results": results
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            output["comparison"] = compare(output, json.load(f), args.tolerance)
+
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    if output.get("comparison", {}).get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
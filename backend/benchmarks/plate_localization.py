@@ -0,0 +1,149 @@
+"""OCR time and accuracy with plate localisation against OCR on the whole vehicle box.
+
+Vehicle boxes are collected from each clip with the YOLO model, then read
+three times through the batched OCR stage: as whole vehicle crops (PaddleOCR
+runs text detection on each); as localised plate lines only; and as the
+estimator reads them with PLATE_FALLBACK, localised lines with the whole box
+read instead when no plate is found and retried when the localised read is
+empty or below ``--fallback-confidence``. Times include locating the plate
+and every fallback read. Reports OCR time per vehicle, how often a plate was
+found or fell back, and how often each path agrees with the whole-box read.
+With ``--labels`` (JSON mapping each clip to the plates visible in it) it also
+reports, per path, the share of labelled plates read exactly (recall) and of
+non-empty reads that are a labelled plate (precision). Run from the backend
+directory:
+
+    python -m benchmarks.plate_localization --clips sample2.mp4 --labels plates.json
+    python -m benchmarks.plate_localization --plate-model models/plates.pt
+"""
+import argparse
+import json
+from time import perf_counter
+
+import cv2
+
+import models
+from batch_ocr import BatchedOCR
+from config import PLATE_FALLBACK_CONFIDENCE
+from plate_locator import PlateLocator
+
+
+def normalize_plate(text):
+    return text.strip().replace(" ", "").upper()
+
+
+def collect_vehicles(video_path, model_path, max_frames, max_vehicles, frame_step):
+    """(frame, box) pairs; frames are kept whole so both paths crop from the same image."""
+    detector = models.detector_for_job(model_path)
+    cap = cv2.VideoCapture(video_path)
+    vehicles = []
+    frame_idx = 0
+    while frame_idx < max_frames and len(vehicles) < max_vehicles:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_idx += 1
+        if frame_idx % frame_step:
+            continue
+        for box in detector.predict(frame, verbose=False)[0].boxes.xyxy.cpu().tolist():
+            vehicles.append((frame, tuple(int(v) for v in box)))
+    cap.release()
+    models.release_detector(detector)
+    return vehicles[:max_vehicles]
+
+
+def read_full_boxes(batch, vehicles):
+    start = perf_counter()
+    for idx, (frame, (x1, y1, x2, y2)) in enumerate(vehicles):
+        batch.submit(idx, frame[max(0, y1):y2, max(0, x1):x2])
+    reads = batch.flush()
+    return reads, perf_counter() - start
+
+
+def read_localized(batch, locator, vehicles, fallback=False):
+    """Localised reads; with ``fallback`` unlocated plates and weak reads use the whole box."""
+    start = perf_counter()
+    located = 0
+    fallbacks = batch.fallbacks
+    for idx, (frame, (x1, y1, x2, y2)) in enumerate(vehicles):
+        crop = frame[max(0, y1):y2, max(0, x1):x2]
+        lines = locator.plate_lines(frame, (x1, y1, x2, y2))
+        if lines:
+            located += 1
+            batch.submit_lines(idx, lines, fallback=crop if fallback else None)
+        elif fallback:
+            batch.submit(idx, crop)
+    reads = batch.flush()
+    return reads, located, batch.fallbacks - fallbacks, perf_counter() - start
+
+
+def agreement(reads, full_reads):
+    both = [idx for idx in reads if normalize_plate(full_reads.get(idx, ("", 0.0))[0])]
+    agree = sum(normalize_plate(reads[idx][0]) == normalize_plate(full_reads[idx][0]) for idx in both)
+    return round(agree / len(both), 3) if both else None
+
+
+def accuracy(reads, labels):
+    texts = [normalize_plate(text) for text, _ in reads.values()]
+    texts = [text for text in texts if text]
+    found = {text for text in texts if text in labels}
+    return {
+        "recall": round(len(found) / len(labels), 3) if labels else None,
+        "precision": round(sum(text in labels for text in texts) / len(texts), 3) if texts else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", default="sample2.mp4", help="comma-separated video files")
+    parser.add_argument("--model", default="models/best.pt")
+    parser.add_argument("--plate-model", default="", help="YOLO plate weights; empty uses the morphological search")
+    parser.add_argument("--labels", help="JSON {clip: [plates visible in the clip]}")
+    parser.add_argument("--max-frames", type=int, default=600)
+    parser.add_argument("--frame-step", type=int, default=5, help="use every Nth frame")
+    parser.add_argument("--max-vehicles", type=int, default=200)
+    parser.add_argument("--fallback-confidence", type=float, default=PLATE_FALLBACK_CONFIDENCE,
+                        help="localised reads below this are retried on the whole box")
+    args = parser.parse_args()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels) as f:
+            labels = {clip: {normalize_plate(plate) for plate in plates} for clip, plates in json.load(f).items()}
+
+    ocr = models.get_ocr()
+    plate_detector = models.detector_for_job(args.plate_model) if args.plate_model else None
+    locator = PlateLocator(detector=plate_detector)
+    batch = BatchedOCR(ocr, batch_size=max(1, args.max_vehicles), fallback_confidence=args.fallback_confidence)
+    results = {}
+    for clip in args.clips.split(","):
+        vehicles = collect_vehicles(clip, args.model, args.max_frames, args.max_vehicles, args.frame_step)
+        if not vehicles:
+            results[clip] = {"vehicles": 0}
+            continue
+        full_reads, full_seconds = read_full_boxes(batch, vehicles)
+        plate_reads, located, _, plate_seconds = read_localized(batch, locator, vehicles)
+        mixed_reads, _, weak_reads, mixed_seconds = read_localized(batch, locator, vehicles, fallback=True)
+
+        result = {
+            "vehicles": len(vehicles),
+            "plates_located": located,
+            "whole_box_reads_with_fallback": len(vehicles) - located + weak_reads,
+            "ms_per_vehicle": {"full_box": round(full_seconds / len(vehicles) * 1000, 2),
+                               "localized": round(plate_seconds / len(vehicles) * 1000, 2),
+                               "localized_with_fallback": round(mixed_seconds / len(vehicles) * 1000, 2)},
+            "speedup_with_fallback": round(full_seconds / mixed_seconds, 2) if mixed_seconds else None,
+            "agreement_with_full_box": {"localized": agreement(plate_reads, full_reads),
+                                        "localized_with_fallback": agreement(mixed_reads, full_reads)}
+        }
+        if clip in labels:
+            result["accuracy"] = {"full_box": accuracy(full_reads, labels[clip]),
+                                  "localized": accuracy(plate_reads, labels[clip]),
+                                  "localized_with_fallback": accuracy(mixed_reads, labels[clip])}
+        results[clip] = result
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Replay a local video as a live stream and report lag, fps and dropped frames.
+
+The file is read at its native frame rate, so when inference is slower than
+the source the dropped-frame counter grows while the lag stays flat. Run
+from the backend directory:
+
+    python -m benchmarks.stream_replay --video sample2.mp4 --interval 1
+"""
+import argparse
+import json
+from time import sleep
+
+from stream import StreamProcessor
+
+REGION = [(0, 145), (1018, 145)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", default="sample2.mp4")
+    parser.add_argument("--model", default="models/best.pt")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between stats lines")
+    args = parser.parse_args()
+
+    stream = StreamProcessor(args.video, args.model, REGION, replay=True, record=False)
+    max_lag = 0.0
+    while stream.active:
+        sleep(args.interval)
+        stats = stream.stats()
+        max_lag = max(max_lag, stats["lag_seconds"])
+        print(json.dumps(stats))
+    stream.stop()
+    print(json.dumps({"state": stream.state, "max_lag_seconds": max_lag, **stream.stats()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
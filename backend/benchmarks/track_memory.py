@@ -0,0 +1,95 @@
+"""Memory of the per-track state over a long synthetic run.
+
+Simulates hours of traffic at a fixed frame rate: vehicles enter every few
+frames, cross the view for a random number of frames and leave, each with a
+new track ID. Every frame goes through ``TrackStore`` and ``PlateCache`` the way
+``SpeedEstimator`` drives them, and the traced memory and number of live tracks
+are sampled along the way. Memory should stay flat once traffic reaches a
+steady state. Run from the backend directory:
+
+    python -m benchmarks.track_memory --hours 4 --fps 30
+"""
+import argparse
+import json
+import random
+import tracemalloc
+from time import perf_counter
+
+from config import OCR_CACHE_TTL_FRAMES, SPEED_WINDOW, TRACK_TTL_FRAMES
+from plate_cache import PlateCache
+from track_store import TrackStore
+
+
+def simulate(frames, fps, arrival_every, min_frames, max_frames, samples, seed):
+    rng = random.Random(seed)
+    tracks = TrackStore(window=SPEED_WINDOW, ttl_frames=TRACK_TTL_FRAMES)
+    plates = PlateCache(ttl_frames=OCR_CACHE_TTL_FRAMES)
+    active = {}  # track_id -> (last frame, x, y, dx)
+    next_id = 1
+    sample_every = max(1, frames // samples)
+    timeline = []
+
+    tracemalloc.start()
+    start = perf_counter()
+    for frame_idx in range(frames):
+        if frame_idx % arrival_every == 0:
+            active[next_id] = (frame_idx + rng.randint(min_frames, max_frames), 0.0, rng.uniform(100, 600),
+                               rng.uniform(5, 40))
+            next_id += 1
+
+        for track_id, (end, x, y, dx) in list(active.items()):
+            if frame_idx >= end:
+                del active[track_id]
+                continue
+            x += dx
+            active[track_id] = (end, x, y, dx)
+            record = tracks.update(track_id, frame_idx, frame_idx / fps, x, y)
+            if plates.needs_ocr(track_id, frame_idx):
+                plates.mark_attempt(track_id, frame_idx)
+                plates.add_read(track_id, f"KA{track_id % 100:02d}AB{track_id % 10000:04d}", 0.95, frame_idx)
+            if record.speed is not None:
+                record.logged = True
+
+        plates.touch(active, frame_idx)
+        plates.evict_stale(frame_idx)
+        tracks.evict_stale(frame_idx)
+
+        if frame_idx % sample_every == 0 or frame_idx == frames - 1:
+            current, _ = tracemalloc.get_traced_memory()
+            timeline.append({"video_hours": round(frame_idx / fps / 3600, 3), "frames": frame_idx,
+                             "tracks_seen": next_id - 1, "live_tracks": len(tracks),
+                             "cached_plates": len(plates), "traced_kb": round(current / 1024, 1)})
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timeline, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=4.0, help="hours of video to simulate")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--arrival-every", type=int, default=10, help="frames between new vehicles")
+    parser.add_argument("--min-frames", type=int, default=30, help="shortest time a vehicle is visible")
+    parser.add_argument("--max-frames", type=int, default=300, help="longest time a vehicle is visible")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    frames = int(args.hours * 3600 * args.fps)
+    timeline, peak, elapsed = simulate(frames, args.fps, args.arrival_every, args.min_frames,
+                                       args.max_frames, args.samples, args.seed)
+    # Compare the second half of the run with the end of the first half: growth here means a leak
+    steady = timeline[len(timeline) // 2:]
+    print(json.dumps({
+        "frames": frames,
+        "seconds": round(elapsed, 2),
+        "track_ttl_frames": TRACK_TTL_FRAMES,
+        "peak_traced_kb": round(peak / 1024, 1),
+        "steady_state_growth_kb": round(steady[-1]["traced_kb"] - steady[0]["traced_kb"], 1),
+        "timeline": timeline
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import hashlib
+import re
+import threading
+from time import time
+
+from config import BLACKLIST_REFRESH_SECONDS, BLACKLIST_FUZZY
+
+# Characters OCR commonly confuses on plates, folded onto one form before matching
+CONFUSABLE = str.maketrans({"O": "0", "Q": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "B": "8"})
+
+
+def normalize_plate(numberplate):
+    return re.sub(r"[^A-Z0-9]", "", (numberplate or "").upper())
+
+
+def canonical_plate(numberplate):
+    return normalize_plate(numberplate).translate(CONFUSABLE)
+
+
+def deletions(text):
+    return {text[:i] + text[i + 1:] for i in range(len(text))}
+
+
+def within_one_edit(a, b):
+    """True if the Levenshtein distance between a and b is at most 1."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+
+class BlacklistIndex:
+    """In-memory blacklist with exact and edit-distance-1 lookups.
+
+    Plates are stored normalised (upper case, alphanumerics only). Fuzzy
+    matching folds OCR confusions such as O/0 and I/1 and then uses a
+    deletion index, so a lookup costs O(plate length) set probes instead of a
+    scan over the blacklist. The set is reloaded through ``loader`` once it is
+    older than ``ttl`` seconds; the API routes also update it directly.
+    """
+
+    def __init__(self, ttl=10, fuzzy=True):
+        self.ttl = ttl
+        self.fuzzy = fuzzy
+        self.lock = threading.Lock()
+        self.loaded_at = None
+        self.plates = set()
+        self.digest = hashlib.sha256(b"").hexdigest()  # Changes whenever the plates do
+        self.canonical = {}  # canonical plate -> blacklisted plate
+        self.deletes = {}  # canonical plate minus one character -> canonical plates
+
+    def __len__(self):
+        return len(self.plates)
+
+    def rebuild(self, plates):
+        with self.lock:
+            self._swap({normalize_plate(plate) for plate in plates})
+            self.loaded_at = time()
+
+    def refresh_if_stale(self, loader):
+        """Reload from ``loader()`` when older than the TTL; a failed load keeps the old set."""
+        if self.loaded_at is not None and time() - self.loaded_at < self.ttl:
+            return
+        plates = loader()
+        if plates is None:
+            self.loaded_at = time()  # Retry after the next TTL instead of on every frame
+            return
+        self.rebuild(plates)
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def add(self, numberplate):
+        plate = normalize_plate(numberplate)
+        if plate:
+            with self.lock:
+                self._swap(self.plates | {plate})
+
+    def discard(self, numberplate):
+        with self.lock:
+            self._swap(self.plates - {normalize_plate(numberplate)})
+
+    def match(self, numberplate):
+        """Return the blacklisted plate matching ``numberplate``, or None."""
+        plate = normalize_plate(numberplate)
+        if not plate:
+            return None
+        if plate in self.plates:
+            return plate
+        if not self.fuzzy:
+            return None
+
+        canonical, deletes = self.canonical, self.deletes
+        query = canonical_plate(plate)
+        if query in canonical:
+            return canonical[query]
+        candidates = set(deletes.get(query, ()))  # OCR dropped a character
+        for variant in deletions(query):
+            if variant in canonical:  # OCR added a character
+                candidates.add(variant)
+            candidates.update(deletes.get(variant, ()))  # OCR substituted a character
+        for candidate in sorted(candidates):
+            if within_one_edit(query, candidate):
+                return canonical[candidate]
+        return None
+
+    def contains(self, numberplate):
+        return self.match(numberplate) is not None
+
+    def _swap(self, plates):
+        # Lookups read without locking, so build new structures and replace them together.
+        # Callers hold self.lock.
+        plates.discard("")
+        canonical, deletes = {}, {}
+        for plate in plates:
+            key = canonical_plate(plate)
+            canonical[key] = plate
+            for variant in deletions(key):
+                deletes.setdefault(variant, set()).add(key)
+        self.plates, self.canonical, self.deletes = plates, canonical, deletes
+        self.digest = hashlib.sha256("\n".join(sorted(plates)).encode()).hexdigest()
+
+
+# Shared by the API routes and every estimator in this process
+blacklist = BlacklistIndex(ttl=BLACKLIST_REFRESH_SECONDS, fuzzy=BLACKLIST_FUZZY)
@@ -0,0 +1,45 @@
+import threading
+from time import time
+
+from config import SETTINGS_TTL, STATS_CACHE_TTL
+
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire after ``ttl`` seconds.
+
+    Values are loaded on demand by the ``loader`` passed to ``get``; writers
+    call ``invalidate`` so the next read in this process reloads immediately.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}  # key -> (value, loaded_at)
+
+    def get(self, key, loader):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and time() - entry[1] < self.ttl:
+            return entry[0]
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time())
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+# Runtime settings stored in MySQL (threshold_speed, ...), shared by routes and estimators
+settings = TTLCache(ttl=SETTINGS_TTL)
+
+# /stats responses, so dashboard refreshes share one rollup query
+stats_cache = TTLCache(ttl=STATS_CACHE_TTL)
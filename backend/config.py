@@ -1,3 +1,10 @@
+import json
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
 # Database configuration
 DB_CONFIG = {
     'host': 'localhost',
@@ -9,3 +16,141 @@ DB_CONFIG = {
 
 # Speed threshold (in km/h)
 SPEED_THRESHOLD = 33
+
+# Background video processing
+# Number of videos processed concurrently by the job pool
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# Finished jobs kept in memory for /jobs lookups before the oldest are dropped
+JOB_HISTORY_LIMIT = int(os.getenv('JOB_HISTORY_LIMIT', '100'))
+
+# Upload deduplication
+# Return the stored result when the same video is uploaded again with the same options
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+# Megabytes the results directory may use before the least recently used results are removed
+RESULT_CACHE_MAX_MB = int(os.getenv('RESULT_CACHE_MAX_MB', '10240'))
+# Megabytes the uploads directory may use before the least recently uploaded videos are removed
+UPLOAD_CACHE_MAX_MB = int(os.getenv('UPLOAD_CACHE_MAX_MB', '10240'))
+
+# Per-track plate OCR cache
+# Identical reads needed before a track's plate is confirmed
+OCR_CONFIRM_VOTES = int(os.getenv('OCR_CONFIRM_VOTES', '3'))
+# Mean OCR confidence that confirms a plate after OCR_MIN_READS matching reads
+OCR_CONFIRM_CONFIDENCE = float(os.getenv('OCR_CONFIRM_CONFIDENCE', '0.9'))
+OCR_MIN_READS = int(os.getenv('OCR_MIN_READS', '2'))
+# OCR attempts per track before settling on the best read so far
+OCR_MAX_READS = int(os.getenv('OCR_MAX_READS', '10'))
+# Frames between OCR retries while a track's plate is unconfirmed
+OCR_RETRY_INTERVAL = int(os.getenv('OCR_RETRY_INTERVAL', '5'))
+# Frames a track may be missing before its cached plate is evicted
+OCR_CACHE_TTL_FRAMES = int(os.getenv('OCR_CACHE_TTL_FRAMES', '30'))
+
+# Batched OCR
+# Plate crops recognised per OCR call
+OCR_BATCH_SIZE = int(os.getenv('OCR_BATCH_SIZE', '16'))
+# Seconds a crop may wait for a fuller batch; 0 flushes once per frame
+OCR_BATCH_MAX_WAIT = float(os.getenv('OCR_BATCH_MAX_WAIT', '0'))
+
+# Plate localisation before OCR
+# Cut the plate out of each vehicle box and recognise only its text lines; off until its
+# accuracy has been checked on footage from the deployed cameras
+PLATE_LOCALIZATION = os.getenv('PLATE_LOCALIZATION', 'false').lower() == 'true'
+# YOLO weights trained on number plates; empty uses the built-in morphological search
+PLATE_MODEL_PATH = os.getenv('PLATE_MODEL_PATH', '')
+# Pixel height plate lines are scaled to (PaddleOCR's recogniser input height)
+PLATE_CROP_HEIGHT = int(os.getenv('PLATE_CROP_HEIGHT', '48'))
+# OCR the whole vehicle box, with text detection, when no plate is found or its read is weak
+PLATE_FALLBACK = os.getenv('PLATE_FALLBACK', 'true').lower() == 'true'
+# Confidence below which a localised read is retried on the whole vehicle box
+PLATE_FALLBACK_CONFIDENCE = float(os.getenv('PLATE_FALLBACK_CONFIDENCE', '0.8'))
+
+# In-memory blacklist
+# Seconds before the blacklist is reloaded from the database
+BLACKLIST_REFRESH_SECONDS = float(os.getenv('BLACKLIST_REFRESH_SECONDS', '10'))
+# Also match plates within one edit (O/0, I/1 and similar OCR confusions)
+BLACKLIST_FUZZY = os.getenv('BLACKLIST_FUZZY', 'true').lower() == 'true'
+
+# Seconds runtime settings (threshold speed, ...) are cached before being re-read
+SETTINGS_TTL = float(os.getenv('SETTINGS_TTL', '30'))
+# Seconds a /stats response is served from cache
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '5'))
+
+# Batched detection writes
+# Rows per executemany flush
+DB_WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', '100'))
+# Seconds a row may wait before a partial batch is flushed
+DB_WRITE_INTERVAL = float(os.getenv('DB_WRITE_INTERVAL', '1.0'))
+# Retries (with reconnect) for a batch failing with a transient error
+DB_WRITE_RETRIES = int(os.getenv('DB_WRITE_RETRIES', '3'))
+# Seconds a job waits for its pending rows to be written when it finishes
+DB_WRITE_FLUSH_TIMEOUT = float(os.getenv('DB_WRITE_FLUSH_TIMEOUT', '30'))
+
+# MySQL connection pool shared by routes, estimators and the detection writer
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+# Seconds to wait for a free connection when the pool is exhausted
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+# Reconnect attempts for a pooled connection the server has dropped
+DB_RECONNECT_ATTEMPTS = int(os.getenv('DB_RECONNECT_ATTEMPTS', '3'))
+
+# Load and warm up YOLO and PaddleOCR at startup instead of on the first job
+PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', 'true').lower() == 'true'
+
+# Pipelined video processing: decode, inference, annotation and encoding on separate threads
+PIPELINE_ENABLED = os.getenv('PIPELINE_ENABLED', 'true').lower() == 'true'
+# Frames buffered between two pipeline stages
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '8'))
+
+# Reduced-work inference (defaults for /upload; each job may override them)
+# Run detection and OCR on every Nth frame and interpolate boxes in between
+FRAME_STRIDE = int(os.getenv('FRAME_STRIDE', '1'))
+# Pixels around the measurement line that inference is limited to; 0 uses the full frame
+ROI_MARGIN = int(os.getenv('ROI_MARGIN', '0'))
+
+# Speed measurement
+# Meters covered by one pixel near the measurement line when a job names no calibration.
+# 0.05 fits a 3.5 m lane about 70 px wide (a 1080p overview of a two-lane road): at 30 fps,
+# 10 px per frame is 54 km/h. Calibrate each camera; uncalibrated jobs log a warning
+DEFAULT_METERS_PER_PIXEL = float(os.getenv('DEFAULT_METERS_PER_PIXEL', '0.05'))
+# Per-camera calibration as JSON, e.g. {"gate-1": 0.045, "highway-north": 0.06}
+CAMERA_CALIBRATION = json.loads(os.getenv('CAMERA_CALIBRATION', '{}'))
+# Track positions (keyframes) a speed estimate is smoothed over
+SPEED_WINDOW = int(os.getenv('SPEED_WINDOW', '5'))
+# Frames a track may be missing before its position history and speed are evicted;
+# keep this above the tracker's lost-track buffer so a returning track is not logged twice
+TRACK_TTL_FRAMES = int(os.getenv('TRACK_TTL_FRAMES', '150'))
+
+# Sharded processing of long videos (selected per job with the `shards` upload field)
+SHARD_PROCESSES = int(os.getenv('SHARD_PROCESSES', str(os.cpu_count() or 2)))
+# Seconds each segment overlaps the previous one; tracks are stitched on this overlap
+SHARD_OVERLAP_SECONDS = float(os.getenv('SHARD_OVERLAP_SECONDS', '2'))
+
+# Live stream ingestion
+# Sources /streams may open, as JSON of name to URL, file path or device index,
+# e.g. {"gate-1": "rtsp://10.0.0.5/stream1", "webcam": 0}; requests name one of them
+STREAM_SOURCES = json.loads(os.getenv('STREAM_SOURCES', '{}'))
+# Streams that may run at once
+STREAM_MAX_STREAMS = int(os.getenv('STREAM_MAX_STREAMS', '4'))
+# JPEG quality of the MJPEG preview
+STREAM_JPEG_QUALITY = int(os.getenv('STREAM_JPEG_QUALITY', '80'))
+# Seconds to wait before reopening a live source that stopped delivering frames
+STREAM_RECONNECT_DELAY = float(os.getenv('STREAM_RECONNECT_DELAY', '2'))
+
+# ffmpeg binary that joins shard outputs without re-encoding; empty looks it up on PATH
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', '')
+
+# Violation alert e-mails (sent by the background alert dispatcher)
+# Seconds within which repeat alerts for the same plate and status are dropped
+ALERT_DEDUPE_SECONDS = float(os.getenv('ALERT_DEDUPE_SECONDS', '300'))
+# Seconds the dispatcher waits after an alert to collect a burst
+ALERT_DIGEST_WINDOW = float(os.getenv('ALERT_DIGEST_WINDOW', '2'))
+# Alerts in one burst that are sent as a single digest e-mail instead
+ALERT_DIGEST_THRESHOLD = int(os.getenv('ALERT_DIGEST_THRESHOLD', '3'))
+# Seconds an idle SMTP session is kept open
+ALERT_SMTP_IDLE_TIMEOUT = float(os.getenv('ALERT_SMTP_IDLE_TIMEOUT', '60'))
+# Alerts waiting to be sent before new ones are dropped
+ALERT_QUEUE_SIZE = int(os.getenv('ALERT_QUEUE_SIZE', '1000'))
+
+# Logging
+# Log level of the backend (DEBUG adds sampled per-track lines)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Frames between sampled per-track debug lines
+LOG_TRACK_EVERY = max(1, int(os.getenv('LOG_TRACK_EVERY', '30')))
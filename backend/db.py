@@ -0,0 +1,67 @@
+import threading
+from contextlib import contextmanager
+from time import time, sleep
+
+import mysql.connector
+from mysql.connector import pooling
+
+from config import DB_CONFIG, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_RECONNECT_ATTEMPTS
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide MySQL connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="vehicle_sur",
+                pool_size=DB_POOL_SIZE,
+                pool_reset_session=True,
+                **DB_CONFIG
+            )
+        return _pool
+
+
+def get_connection(timeout=DB_POOL_TIMEOUT):
+    """Check a healthy connection out of the pool, or return None if none is available.
+
+    Waits up to ``timeout`` seconds when the pool is exhausted. Each connection
+    is pinged before use and reconnected if the server dropped it. Calling
+    ``close()`` on the returned connection hands it back to the pool.
+    """
+    deadline = time() + timeout
+    while True:
+        try:
+            conn = get_pool().get_connection()
+        except pooling.PoolError:
+            if time() >= deadline:
+                print("Database connection failed: pool exhausted")
+                return None
+            sleep(0.05)
+            continue
+        except mysql.connector.Error as err:
+            print(f"Database connection failed: {err}")
+            return None
+
+        try:
+            conn.ping(reconnect=True, attempts=DB_RECONNECT_ATTEMPTS, delay=0.2)
+            return conn
+        except mysql.connector.Error as err:
+            print(f"Database connection failed: {err}")
+            conn.close()
+            return None
+
+
+@contextmanager
+def connection(timeout=DB_POOL_TIMEOUT):
+    """Context manager around ``get_connection``; raises if no connection is available."""
+    conn = get_connection(timeout)
+    if conn is None:
+        raise mysql.connector.errors.PoolError("Database connection failed")
+    try:
+        yield conn
+    finally:
+        conn.close()
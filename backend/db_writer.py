@@ -0,0 +1,230 @@
+import atexit
+import queue
+import threading
+from time import time, sleep
+
+import mysql.connector
+
+import db
+import metrics
+import rollups
+from config import DB_WRITE_BATCH_SIZE, DB_WRITE_INTERVAL, DB_WRITE_RETRIES, DB_WRITE_FLUSH_TIMEOUT
+
+# Errors worth retrying after reconnecting: dropped connections, lock wait timeout, deadlock
+TRANSIENT_ERRNOS = {1205, 1213, 2006, 2013}
+
+
+class FlushRequest(threading.Event):
+    """Queued by ``flush``; set once the rows before it were handled, ``flushed`` says if all were written."""
+
+    flushed = False
+
+
+class DetectionWriter:
+    """Background writer that batches ``my_data`` rows into ``executemany`` calls.
+
+    ``write`` only enqueues, so the frame loop never waits on MySQL. The worker
+    thread flushes when ``batch_size`` rows are pending or the oldest pending
+    row is ``flush_interval`` seconds old, checking a connection out of the
+    pool for each flush and retrying transient errors with a fresh one. Rows
+    of a batch that still fails stay pending and are retried on the next
+    flush instead of being dropped; only rows that fail on their own with a
+    non-transient error are dropped. The stats rollups (see rollups.py) are
+    updated in the same transaction.
+    """
+
+    INSERT_QUERY = """
+        INSERT INTO my_data (date, time, track_id, class_name, speed, numberplate, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+
+    def __init__(self, connect=db.get_connection, batch_size=100, flush_interval=1.0, max_retries=3,
+                 flush_timeout=30.0):
+        self.connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.flush_timeout = flush_timeout
+        self.queue = queue.Queue()
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.pending = 0  # Rows taken off the queue but not yet written
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, row):
+        self.queue.put(row)
+
+    def flush(self, timeout=None):
+        """Wait until every row written before this call has been flushed.
+
+        Waits at most ``timeout`` seconds (``flush_timeout`` by default).
+        Returns False if the rows were not flushed in time or some are still
+        pending because the database is unreachable.
+        """
+        if not self.thread.is_alive():
+            return False
+        done = FlushRequest()
+        self.queue.put(done)
+        return done.wait(self.flush_timeout if timeout is None else timeout) and done.flushed
+
+    def close(self, timeout=None):
+        """Keep flushing until every row is written or ``timeout`` (``flush_timeout``) passes, then stop."""
+        deadline = time() + (self.flush_timeout if timeout is None else timeout)
+        while not self.flush(max(0.0, deadline - time())) and self.thread.is_alive() and time() < deadline:
+            sleep(min(0.5, max(0.0, deadline - time())))
+        self.queue.put(None)
+        self.thread.join(max(0.0, deadline - time()) + 1.0)
+        lost = self.queue.qsize() + self.pending
+        if lost:
+            print(f"Detection writer stopped with {lost} rows not written")
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "rows_pending": self.pending,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2)
+        }
+
+    def _run(self):
+        batch = []
+        first_row_at = None
+        while True:
+            timeout = None
+            if batch:
+                timeout = max(0.0, self.flush_interval - (time() - first_row_at))
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False  # Flush interval elapsed
+
+            try:
+                if item is None:
+                    self._flush(batch)
+                    return
+                if isinstance(item, FlushRequest):
+                    self._flush(batch)
+                elif item is not False:
+                    if not batch:
+                        first_row_at = time()
+                    batch.append(item)
+                    if len(batch) < self.batch_size:
+                        continue
+                    self._flush(batch)
+                else:
+                    self._flush(batch)
+            except Exception as e:
+                # Never let an unexpected error stop the thread; flush() callers would wait forever
+                print(f"Detection writer error: {str(e)}")
+            finally:
+                self.pending = len(batch)
+                if isinstance(item, FlushRequest):
+                    item.flushed = not batch
+                    item.set()
+
+            if batch:
+                first_row_at = time()  # Failed rows wait another interval before retrying
+
+    def _flush(self, batch):
+        """Write and remove rows from ``batch``; rows stay in it while the database is unreachable.
+
+        A batch failing with a non-transient error (a bad row, a constraint)
+        is retried row by row so only the offending rows are dropped.
+        """
+        if not batch:
+            return
+        start = time()
+        for attempt in range(self.max_retries + 1):
+            try:
+                attempt_start = time()
+                self._write(batch)
+                metrics.DB_SECONDS.labels("insert_batch").observe(time() - attempt_start)
+                self.rows_written += len(batch)
+                batch.clear()
+                break
+            except Exception as err:
+                metrics.DB_ERRORS.labels("insert_batch").inc()
+                print(f"Error saving to database (attempt {attempt + 1}): {err}")
+                if not is_transient(err):
+                    self._write_each(batch)
+                    break
+                if attempt < self.max_retries:
+                    sleep(min(0.5 * 2 ** attempt, 5.0))
+        self.flushes += 1
+        self.last_flush_ms = (time() - start) * 1000
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+
+    def _write_each(self, batch):
+        """Write rows one at a time, dropping those that fail; stops at a transient error."""
+        remaining = []
+        for index, row in enumerate(batch):
+            try:
+                self._write([row])
+                self.rows_written += 1
+            except Exception as err:
+                if is_transient(err):
+                    remaining = batch[index:]  # Retried on the next flush
+                    break
+                metrics.DB_ERRORS.labels("insert_row").inc()
+                self.rows_dropped += 1
+                print(f"Dropping detection row {row!r}: {err}")
+        batch[:] = remaining
+
+    def _write(self, rows):
+        """Insert ``rows`` and update the rollups in one transaction."""
+        connection = self.connect()
+        if connection is None:
+            raise mysql.connector.errors.PoolError("Database connection not available")
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.executemany(self.INSERT_QUERY, rows)
+                # Same transaction, so the dashboard rollups never drift from my_data
+                rollups.update_rollups(cursor, rows)
+                connection.commit()
+            finally:
+                cursor.close()
+        except Exception:
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            connection.close()
+
+
+def is_transient(err):
+    """Connection and locking errors that may succeed on a fresh connection."""
+    if not isinstance(err, mysql.connector.Error):
+        return False
+    return isinstance(err, (mysql.connector.errors.OperationalError,
+                            mysql.connector.errors.InterfaceError,
+                            mysql.connector.errors.PoolError)) or err.errno in TRANSIENT_ERRNOS
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the process-wide detection writer, starting it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = DetectionWriter(
+                batch_size=DB_WRITE_BATCH_SIZE,
+                flush_interval=DB_WRITE_INTERVAL,
+                max_retries=DB_WRITE_RETRIES,
+                flush_timeout=DB_WRITE_FLUSH_TIMEOUT
+            )
+            atexit.register(_writer.close)
+            metrics.DB_WRITER_QUEUE.set_function(_writer.queue.qsize)
+        return _writer
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+from datetime import date
+
+import db
+import metrics
+import rollups
+
+COLUMNS = ("id", "date", "time", "track_id", "class_name", "speed", "numberplate", "status")
+
+
+def ensure_indexes(connection):
+    """Indexes behind the ``/detections`` filters; run by migrations.py.
+
+    Pages are ordered by ``id``. An exact ``plate`` or ``status`` filter seeks
+    into its ``(column, id)`` index and reads one page in ``id`` order. A
+    range (``date_from``/``date_to``, a plate prefix, ``min_speed``/
+    ``max_speed``) cannot be: its index is ordered by the ranged column
+    first, so MySQL either reads every row in the range and sorts it, or
+    walks the primary key newest first and filters. Both are cheap when the
+    range is narrow or matches recent rows, and grow with the table when a
+    wide range matches only old or rare rows. The ``date`` index comes with
+    the rollups (see rollups.py).
+    """
+    cursor = connection.cursor()
+    try:
+        rollups.ensure_index(cursor, "my_data", "idx_my_data_plate_id", "numberplate, id")
+        rollups.ensure_index(cursor, "my_data", "idx_my_data_status_id", "status, id")
+        rollups.ensure_index(cursor, "my_data", "idx_my_data_speed_id", "speed, id")
+    finally:
+        cursor.close()
+
+
+def parse_filters(args):
+    """Filters from the query string; raises ValueError on invalid values."""
+    filters = {}
+    plate = args.get("plate", "").replace(" ", "").upper()
+    if plate:
+        # A trailing * asks for a prefix search
+        if plate.endswith("*"):
+            filters["plate_prefix"] = plate.rstrip("*")
+        else:
+            filters["plate"] = plate
+    for key in ("date_from", "date_to"):
+        if args.get(key):
+            filters[key] = date.fromisoformat(args[key])
+    if "status" in args:
+        # An empty status selects vehicles that were neither speeding nor blacklisted
+        filters["status"] = args["status"].strip().upper()
+    for key in ("min_speed", "max_speed"):
+        if args.get(key):
+            filters[key] = float(args[key])
+    return filters
+
+
+def build_query(filters, after=None, limit=100):
+    """Newest-first page of ``my_data``; ``after`` is the last ``id`` of the previous page."""
+    clauses, params = [], []
+    if "plate" in filters:
+        clauses.append("numberplate = %s")
+        params.append(filters["plate"])
+    if filters.get("plate_prefix"):
+        escaped = filters["plate_prefix"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("numberplate LIKE %s")
+        params.append(escaped + "%")
+    if "date_from" in filters:
+        clauses.append("date >= %s")
+        params.append(filters["date_from"])
+    if "date_to" in filters:
+        clauses.append("date <= %s")
+        params.append(filters["date_to"])
+    if "status" in filters:
+        clauses.append("status = %s")
+        params.append(filters["status"])
+    if "min_speed" in filters:
+        clauses.append("speed >= %s")
+        params.append(filters["min_speed"])
+    if "max_speed" in filters:
+        clauses.append("speed <= %s")
+        params.append(filters["max_speed"])
+    if after is not None:
+        clauses.append("id < %s")
+        params.append(after)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"SELECT {', '.join(COLUMNS)} FROM my_data {where} ORDER BY id DESC LIMIT %s"
+    params.append(limit)
+    return query, params
+
+
+def serialize(row):
+    """Make DATE, TIME (timedelta) and DECIMAL columns JSON/CSV friendly."""
+    return {
+        "id": row["id"],
+        "date": row["date"].isoformat() if row["date"] is not None else None,
+        "time": str(row["time"]) if row["time"] is not None else None,
+        "track_id": row["track_id"],
+        "class_name": row["class_name"],
+        "speed": float(row["speed"]) if row["speed"] is not None else None,
+        "numberplate": row["numberplate"],
+        "status": row["status"]
+    }
+
+
+def fetch_page(filters, after=None, limit=100):
+    with metrics.DB_SECONDS.labels("detections").time(), db.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(*build_query(filters, after, limit))
+            return [serialize(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+
+def iter_rows(filters, after=None, limit=None, page_size=1000):
+    """Yield matching rows page by page; only one page is held in memory.
+
+    Each page is a separate indexed keyset query on a pooled connection, so
+    a slow client never holds a connection or a long-running query open.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        rows = fetch_page(filters, after, size)
+        yield from rows
+        if len(rows) < size:
+            return
+        after = rows[-1]["id"]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
@@ -19,6 +19,8 @@ EMAIL_RECEIVER = os.getenv('EMAIL_RECEIVER')
 # SMTP Configuration (Gmail settings)
 SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
 SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+# Upgrade the session with STARTTLS; disable for a local test server
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
 
 # Email Settings
 EMAIL_ENABLED = os.getenv('EMAIL_ENABLED', 'true').lower() == 'true'
@@ -0,0 +1,135 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class Job:
+    """State of one queued video processing request."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, input_path, options=None, key=None):
+        self.id = uuid.uuid4().hex
+        self.input_path = input_path
+        self.options = options or {}
+        self.key = key  # Result cache key: upload hash plus processing options
+        self.state = Job.QUEUED
+        self.frames_done = 0
+        self.total_frames = 0
+        self.result_path = None
+        self.summary = None  # Per-vehicle totals of the processed video
+        self.drift = None  # Speed difference against a full-rate run, when requested
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.state in (Job.DONE, Job.FAILED)
+
+    def update_progress(self, frames_done, total_frames=None):
+        self.frames_done = frames_done
+        if total_frames:
+            self.total_frames = total_frames
+
+    def to_dict(self):
+        percent = 0.0
+        if self.total_frames:
+            percent = round(min(self.frames_done / self.total_frames, 1.0) * 100, 1)
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "progress": {
+                "frames_done": self.frames_done,
+                "total_frames": self.total_frames,
+                "percent": percent
+            },
+            "options": self.options,
+            "result_path": self.result_path,
+            "summary": self.summary,
+            "drift": self.drift,
+            "error": self.error,
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "started_at": self.started_at.strftime("%Y-%m-%d %H:%M:%S") if self.started_at else None,
+            "finished_at": self.finished_at.strftime("%Y-%m-%d %H:%M:%S") if self.finished_at else None
+        }
+
+
+class JobManager:
+    """Runs video jobs on a bounded thread pool and keeps their status for polling.
+
+    ``process`` is called with the ``Job`` and must return the result path (or
+    ``None`` on failure). Exceptions are recorded on the job so a failing video
+    never blocks the jobs queued after it. Submitting with the ``key`` of a job
+    that is still queued or running returns that job instead of a new one.
+    """
+
+    def __init__(self, process, max_workers=2, history_limit=100):
+        self.process = process
+        self.history_limit = history_limit
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="video-job")
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, input_path, key=None, **options):
+        with self.lock:
+            if key is not None:
+                for job in self.jobs.values():
+                    if job.key == key and not job.finished:
+                        return job
+            job = Job(input_path, options, key)
+            self.jobs[job.id] = job
+            self._prune()
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def active_keys(self):
+        """Result file names (cache key, else job id) of jobs still queued or running."""
+        with self.lock:
+            return {job.key or job.id for job in self.jobs.values() if not job.finished}
+
+    def active_inputs(self):
+        """Input files of jobs still queued or running."""
+        with self.lock:
+            return {job.input_path for job in self.jobs.values() if not job.finished}
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def _run(self, job):
+        job.state = Job.RUNNING
+        job.started_at = datetime.now()
+        try:
+            result_path = self.process(job)
+            if result_path:
+                job.result_path = result_path
+                job.state = Job.DONE
+            else:
+                job.error = "Video processing failed"
+                job.state = Job.FAILED
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.state = Job.FAILED
+        finally:
+            job.finished_at = datetime.now()
+
+    def _prune(self):
+        # Drop the oldest finished jobs once the history limit is exceeded
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self.jobs) - self.history_limit)]:
+            del self.jobs[job_id]
@@ -1,220 +1,323 @@
 import cv2
-from time import time
+import logging
 import numpy as np
 from ultralytics.solutions.solutions import BaseSolution
 from ultralytics.utils.plotting import Annotator, colors
 from datetime import datetime
-import mysql.connector
+import db
+import models
 from paddleocr import PaddleOCR
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
-import os
+from plate_cache import PlateCache
+from track_store import TrackStore
+from plate_locator import PlateLocator
+from batch_ocr import BatchedOCR
+from blacklist_index import BlacklistIndex, blacklist
+from cache import settings
+from db_writer import get_writer
+from alerts import send_violation_email
+import metrics
+from config import (OCR_CONFIRM_VOTES, OCR_CONFIRM_CONFIDENCE, OCR_MIN_READS, OCR_MAX_READS,
+                    OCR_RETRY_INTERVAL, OCR_CACHE_TTL_FRAMES, OCR_BATCH_SIZE, OCR_BATCH_MAX_WAIT,
+                    PLATE_LOCALIZATION, PLATE_MODEL_PATH, PLATE_CROP_HEIGHT, PLATE_FALLBACK,
+                    PLATE_FALLBACK_CONFIDENCE, DEFAULT_METERS_PER_PIXEL, SPEED_WINDOW, TRACK_TTL_FRAMES,
+                    LOG_TRACK_EVERY, BLACKLIST_FUZZY)
 
 # Load environment variables
 load_dotenv()
 
-# Import email configuration
-try:
-    from email_config import EMAIL_SENDER, EMAIL_PASSWORD, EMAIL_RECEIVER, SMTP_SERVER, SMTP_PORT, EMAIL_ENABLED
-except ImportError:
-    # Fallback to environment variables if config file doesn't exist
-    EMAIL_SENDER = os.getenv('EMAIL_SENDER')
-    EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
-    EMAIL_RECEIVER = os.getenv('EMAIL_RECEIVER')
-    SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-    SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
-    EMAIL_ENABLED = os.getenv('EMAIL_ENABLED', 'true').lower() == 'true'
+logger = logging.getLogger(__name__)
+
+
+def load_blacklist():
+    """Blacklisted plates from MySQL, or None if they could not be loaded."""
+    try:
+        with metrics.DB_SECONDS.labels("load_blacklist").time(), db.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT numberplate FROM blacklisted_vehicles")
+            plates = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+        return plates
+    except Exception as e:
+        metrics.DB_ERRORS.labels("load_blacklist").inc()
+        logger.error(f"Blacklist load error: {str(e)}")
+        return None
+
+
+def get_threshold_speed():
+    """Speed limit in km/h from the settings table; 50 when it cannot be read."""
+    try:
+        with metrics.DB_SECONDS.labels("load_threshold").time(), db.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT threshold_speed FROM settings WHERE id = 1")
+            result = cursor.fetchone()
+            cursor.close()
+        threshold_speed = result[0] if result else 50.0
+        logger.info(f"Current threshold: {threshold_speed} km/h")
+        return threshold_speed
+    except Exception as e:
+        metrics.DB_ERRORS.labels("load_threshold").inc()
+        logger.error(f"Threshold fetch error: {str(e)}")
+        return 50.0
+
 
 class SpeedEstimator(BaseSolution):
-    def __init__(self, **kwargs):
+    def __init__(self, detector=None, ocr=None, roi=None, record=True, fps=30.0,
+                 meters_per_pixel=DEFAULT_METERS_PER_PIXEL, speed_window=SPEED_WINDOW,
+                 detection_sink=None, threshold_speed=None, blacklist_plates=None, **kwargs):
+        """``detector`` and ``ocr`` take preloaded models (see models.py) instead of loading new ones;
+        ``release`` hands the detector back once the job is done.
+
+        ``roi`` (x1, y1, x2, y2) limits detection to that part of the frame. With
+        ``record=False`` nothing is written to the database or emailed, and a
+        ``detection_sink`` receives each logged detection (as a dict) instead. Speeds
+        are measured in video time (frame index / ``fps``) over the last
+        ``speed_window`` positions of a track and converted with the camera's
+        ``meters_per_pixel`` calibration.
+
+        ``threshold_speed`` and ``blacklist_plates`` fix the speed limit and the
+        blacklist for this estimator instead of reading them from MySQL, so a
+        shard worker (see sharding.py) makes no database calls.
+        """
+        if detector is not None:
+            # YOLO() wraps an already loaded model instead of reading the weights again
+            kwargs["model"] = detector
         super().__init__(**kwargs)
+        self.detector = detector
         self.initialize_region()
-        self.spd = {}  # Stores calculated speed values
-        self.trkd_ids = []
-        self.trk_pt = {}  # Stores previous timestamps
-        self.trk_pp = {}  # Stores previous positions
-        self.logged_ids = set()
+        self.frame_idx = 0
+        self.roi = roi
+        self.record = record
+        self.detection_sink = detection_sink
+        self.fps = fps
+        self.meters_per_pixel = meters_per_pixel
+        self.speed_window = max(2, speed_window)
+        # Recent positions, speed and logged flag per track; stale tracks are evicted
+        self.track_store = TrackStore(window=self.speed_window, ttl_frames=TRACK_TTL_FRAMES)
         # Initialize PaddleOCR
-        self.ocr = PaddleOCR(use_angle_cls=True, lang='en')
-        self.db_connection = self.connect_to_db()
+        self.ocr = ocr if ocr is not None else PaddleOCR(use_angle_cls=True, lang='en')
+        # Plates read so far per track; OCR stops once a plate is confirmed
+        self.plates = PlateCache(
+            confirm_votes=OCR_CONFIRM_VOTES,
+            confirm_confidence=OCR_CONFIRM_CONFIDENCE,
+            min_reads=OCR_MIN_READS,
+            max_reads=OCR_MAX_READS,
+            retry_interval=OCR_RETRY_INTERVAL,
+            ttl_frames=OCR_CACHE_TTL_FRAMES
+        )
+        # Only the plate's text lines go to OCR when localisation is enabled
+        self.locator = None
+        if PLATE_LOCALIZATION:
+            plate_detector = models.detector_for_job(PLATE_MODEL_PATH) if PLATE_MODEL_PATH else None
+            self.locator = PlateLocator(detector=plate_detector, height=PLATE_CROP_HEIGHT)
+        self.batch_ocr = BatchedOCR(self.ocr, batch_size=OCR_BATCH_SIZE, max_wait=OCR_BATCH_MAX_WAIT,
+                                    fallback_confidence=PLATE_FALLBACK_CONFIDENCE)
+        # Detection rows are written in batches off the frame loop
+        self.writer = get_writer() if record and detection_sink is None else None
         self.speed_threshold = 50  # Default speed threshold
-        # Email configuration
-        self.email_sender = EMAIL_SENDER
-        self.email_password = EMAIL_PASSWORD
-        self.email_receiver = EMAIL_RECEIVER
-        self.smtp_server = SMTP_SERVER
-        self.smtp_port = SMTP_PORT
-        self.email_enabled = EMAIL_ENABLED
-
-    def connect_to_db(self):
-        try:
-            connection = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="nikhil",
-                database="numberplates_speed"
-            )
-            return connection
-        except mysql.connector.Error as err:
-            print(f"Error connecting to database: {err}")
-            return None
-
-    def perform_ocr(self, image_array):
-        if isinstance(image_array, np.ndarray):
-            results = self.ocr.ocr(image_array, rec=True)
-            if results and results[0]:
-                return ' '.join([result[1][0] for result in results[0]])
-        return ""
+        self.fixed_threshold = threshold_speed
+        self.blacklist = blacklist
+        if blacklist_plates is not None:
+            # Private copy that is never reloaded
+            self.blacklist = BlacklistIndex(ttl=float("inf"), fuzzy=BLACKLIST_FUZZY)
+            self.blacklist.rebuild(blacklist_plates)
+
+    def extract_tracks(self, im0):
+        """Track on the region of interest only and map boxes back to frame coordinates."""
+        if self.roi is None:
+            return super().extract_tracks(im0)
+        height, width = im0.shape[:2]
+        x1, y1, x2, y2 = self.roi
+        x1, x2 = max(0, int(x1)), min(width, int(x2))
+        y1, y2 = max(0, int(y1)), min(height, int(y2))
+        super().extract_tracks(np.ascontiguousarray(im0[y1:y2, x1:x2]))
+        if len(self.boxes):
+            self.boxes = self.boxes + self.boxes.new_tensor([x1, y1, x1, y1])
+
+    def queue_plate_reads(self, im0):
+        """Submit plates of tracks whose plate is still unconfirmed to the OCR batch.
+
+        Crops are views of ``im0``; the batch is recognised before the frame is
+        annotated unless ``OCR_BATCH_MAX_WAIT`` defers it, and then it copies them.
+        """
+        height, width = im0.shape[:2]
+        for box, track_id in zip(self.boxes, self.track_ids):
+            if not self.plates.needs_ocr(track_id, self.frame_idx):
+                metrics.OCR_CACHE_HITS.inc()
+                continue
+            x1, y1, x2, y2 = map(int, box)
+            x1, y1, x2, y2 = max(0, x1), max(0, y1), min(width, x2), min(height, y2)
+            lines = self.locator.plate_lines(im0, (x1, y1, x2, y2)) if self.locator is not None else None
+            if lines:
+                self.batch_ocr.submit_lines(track_id, lines, fallback=im0[y1:y2, x1:x2] if PLATE_FALLBACK else None)
+            elif self.locator is None or PLATE_FALLBACK:
+                self.batch_ocr.submit(track_id, im0[y1:y2, x1:x2])
+            else:
+                # No plate found and nothing sent to OCR: still an attempt towards OCR_MAX_READS
+                self.plates.add_read(track_id, "", 0.0, self.frame_idx)
+            self.plates.mark_attempt(track_id, self.frame_idx)
+        self.store_plate_reads(self.batch_ocr.poll())
+
+    def store_plate_reads(self, reads):
+        for track_id, (plate_text, confidence) in reads.items():
+            plate_text = plate_text.strip().replace(" ", "")  # Normalize OCR text
+            self.plates.add_read(track_id, plate_text, confidence, self.frame_idx)
+
+    def finish(self):
+        """Flush work still pending when the video ends."""
+        self.store_plate_reads(self.batch_ocr.flush())
+        # Tracks still on screen at the end are logged with their best read
+        threshold_speed = self.current_threshold()
+        current_time = datetime.now()
+        for track_id in list(self.plates.tracks):
+            self.log_best_read(track_id, threshold_speed, current_time)
+        if self.writer is not None and not self.writer.flush():
+            logger.warning("Detection rows were not written before the flush timeout")
+
+    def release(self):
+        """Give the detectors checked out for this estimator back to the pool (see models.py)."""
+        models.release_detector(self.detector)
+        if self.locator is not None:
+            models.release_detector(self.locator.detector)
+        self.detector = None
 
     def save_to_database(self, date, time, track_id, class_name, speed, numberplate, status=""):
-        if not self.db_connection:
-            print("Database connection not available. Skipping save.")
-            return
-        try:
-            cursor = self.db_connection.cursor()
-            query = """
-                INSERT INTO my_data (date, time, track_id, class_name, speed, numberplate, status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(query, (date, time, track_id, class_name, speed, numberplate.replace(" ", ""), status))
-            self.db_connection.commit()
-        except mysql.connector.Error as err:
-            print(f"Error saving to database: {err}")
+        self.writer.write((date, time, track_id, class_name, speed, numberplate.replace(" ", ""), status))
 
     def is_blacklisted(self, numberplate):
-        if not self.db_connection or not numberplate:
-            return False
-        try:
-            cursor = self.db_connection.cursor()
-            query = "SELECT EXISTS(SELECT 1 FROM blacklisted_vehicles WHERE numberplate = %s)"
-            cursor.execute(query, (numberplate,))
-            result = cursor.fetchone()
-            return result[0] == 1
-        except Exception as e:
-            print(f"Blacklist check error for {numberplate}: {str(e)}")
+        if not numberplate:
             return False
+        if self.blacklist is blacklist:
+            blacklist.refresh_if_stale(load_blacklist)
+        return self.blacklist.contains(numberplate)
+
+    def current_threshold(self):
+        if self.fixed_threshold is not None:
+            return self.fixed_threshold
+        return settings.get("threshold_speed", get_threshold_speed)
 
     def send_email(self, numberplate, speed, status):
         """Send email notification for blacklisted or overspeeding vehicles."""
-        if not self.email_enabled:
-            print("Email notifications are disabled")
-            return
-            
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = self.email_sender
-            msg['To'] = self.email_receiver
-            msg['Subject'] = f"Vehicle Violation Alert: {status}"
-
-            body = f"""
-            A vehicle violation has been detected:
-            Number Plate: {numberplate}
-            Speed: {speed} km/h
-            Status: {status}
-            Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-            """
-            msg.attach(MIMEText(body, 'plain'))
-
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email_sender, self.email_password)
-                server.sendmail(self.email_sender, self.email_receiver, msg.as_string())
-            print(f"Email sent for {status} vehicle: {numberplate}")
-        except Exception as e:
-            print(f"Failed to send email: {str(e)}")
-
-    def get_threshold_speed(self):
-        try:
-            cursor = self.db_connection.cursor()
-            cursor.execute("SELECT threshold_speed FROM settings WHERE id = 1")
-            result = cursor.fetchone()
-            return result[0] if result else 50.0
-        except Exception as e:
-            print(f"Threshold fetch error: {str(e)}")
-            return 50.0
+        send_violation_email(numberplate, speed, status)
 
     def estimate_speed(self, im0):
-        self.annotator = Annotator(im0, line_width=self.line_width)
-        self.extract_tracks(im0)
+        """Track, read plates and estimate speeds for one frame, then draw the results on it."""
+        results = self.process_frame(im0)
+        self.annotate(im0, results)
+        return results
+
+    def annotate(self, im0, results):
+        """Draw the boxes and labels produced by ``process_frame``; returns the annotated frame."""
+        with metrics.ANNOTATION.time():
+            self.annotator = Annotator(im0, line_width=self.line_width)
+            for result in results:
+                self.annotator.box_label(result["box"], result["label"], color=result["color"])
+            return self.annotator.result()
+
+    def process_frame(self, im0, frame_idx=None):
+        """Everything except drawing, so annotation can run on another thread.
+
+        ``frame_idx`` is the frame's position in the video when frames are skipped.
+        """
+        with metrics.TRACKING.time():
+            self.extract_tracks(im0)
+        metrics.FRAMES_PROCESSED.inc()
+        self.frame_idx = frame_idx if frame_idx is not None else self.frame_idx + 1
+        # Per-track debug lines for a sample of frames only; console output costs throughput
+        log_tracks = self.frame_idx % LOG_TRACK_EVERY == 0 and logger.isEnabledFor(logging.DEBUG)
         current_time = datetime.now()
         results = []
 
-        # Fetch threshold speed from database
-        threshold_speed = self.get_threshold_speed()
-        print(f"Current threshold: {threshold_speed} km/h")
+        # Threshold speed from the shared settings cache (re-read from the database on expiry)
+        threshold_speed = self.current_threshold()
+
+        # OCR every unconfirmed plate of this frame in one batch
+        self.queue_plate_reads(im0)
 
         for box, track_id, cls in zip(self.boxes, self.track_ids, self.clss):
             x1, y1, x2, y2 = map(int, box)
-            cropped_image = np.array(im0)[y1:y2, x1:x2]
-            ocr_text = self.perform_ocr(cropped_image).strip().replace(" ", "")  # Normalize OCR text
+            ocr_text = self.plates.plate(track_id)
             class_name = self.names[int(cls)]
 
-            if track_id not in self.trk_pt:
-                self.trk_pt[track_id] = time()
-                self.trk_pp[track_id] = box
-
-            current_time_sec = time()
-            time_diff = current_time_sec - self.trk_pt[track_id]
-
-            if track_id not in self.spd and time_diff > 0.05:  
-                prev_center = np.array([(self.trk_pp[track_id][0] + self.trk_pp[track_id][2]) / 2,
-                                        (self.trk_pp[track_id][1] + self.trk_pp[track_id][3]) / 2])
-                curr_center = np.array([(x1 + x2) / 2, (y1 + y2) / 2])
-
-                distance_moved = np.linalg.norm(curr_center - prev_center)
-                avg_speed_kmh = (distance_moved / time_diff) * 3.6
-                self.spd[track_id] = round(avg_speed_kmh, 2)
-
-            speed = self.spd.get(track_id, 0)
-            self.trk_pt[track_id] = current_time_sec
-            self.trk_pp[track_id] = box
-
-            # Debugging prints
-            print(f"Track ID {track_id} | Speed: {speed} km/h | Plate: {ocr_text}")
-
-            # Initialize values
-            color = (0, 128, 0)  # DARK GREEN (BGR format)
-            status = ""
-            text = f"{ocr_text} | {speed} km/h"
-
-            # Blacklist check with normalization
-            if ocr_text and self.is_blacklisted(ocr_text):
-                print(f"BLACKLIST DETECTED: {ocr_text}")
-                color = (0, 0, 255)  # RED
-                status = "BLACKLISTED"
-                text = f"{ocr_text} | BLACKLISTED | {speed} km/h"
-            elif speed > threshold_speed:
-                color = (255, 0, 0)  # BLUE
-                status = "OVER SPEED"
-                text = f"{ocr_text} | OVER SPEED | {speed} km/h"
-
-            # Always draw the box
-            self.annotator.box_label((x1, y1, x2, y2), text, color=color)
-
-            # Database logging and email notification - only log if speed has been calculated
-            if track_id not in self.logged_ids and ocr_text and track_id in self.spd:
-                self.save_to_database(
-                    current_time.strftime("%Y-%m-%d"),
-                    current_time.strftime("%H:%M:%S"),
-                    track_id,
-                    class_name,
-                    speed,
-                    ocr_text,
-                    status
-                )
-                # Send email if the vehicle is blacklisted or overspeeding
-                if status in ["BLACKLISTED", "OVER SPEED"]:
-                    self.send_email(ocr_text, speed, status)
-                self.logged_ids.add(track_id)
+            # Speed from video time, so processing rate does not change the result
+            track = self.track_store.update(track_id, self.frame_idx, self.frame_idx / self.fps,
+                                       (x1 + x2) / 2, (y1 + y2) / 2, self.meters_per_pixel)
+            track.class_name = class_name
+            speed = track.speed if track.speed is not None else 0
+
+            if log_tracks:
+                logger.debug(f"Frame {self.frame_idx} | Track ID {track_id} | Speed: {speed} km/h | Plate: {ocr_text}")
+
+            status, color, text = self.classify(ocr_text, speed, threshold_speed)
+
+            # Database logging and email notification - once the speed is known and the plate
+            # is confirmed by votes or out of OCR attempts
+            if not track.logged and ocr_text and track.speed is not None and self.plates.is_settled(track_id):
+                self.log_detection(track_id, track, ocr_text, status, current_time)
 
             results.append({
                 "track_id": track_id,
                 "class_name": class_name,
                 "speed": speed,
                 "numberplate": ocr_text,
-                "status": status
+                "status": status,
+                "box": (x1, y1, x2, y2),  # Always drawn
+                "label": text,
+                "color": color
             })
 
-        return results
\ No newline at end of file
+        self.plates.touch(self.track_ids, self.frame_idx)
+        # Tracks that left before their plate was confirmed are logged with their best read
+        for track_id in self.plates.stale(self.frame_idx):
+            self.log_best_read(track_id, threshold_speed, current_time)
+        self.plates.evict_stale(self.frame_idx)
+        self.track_store.evict_stale(self.frame_idx)
+        return results
+
+    def classify(self, plate, speed, threshold_speed):
+        """Status, box color (BGR) and label of a vehicle."""
+        # Blacklist check with normalization
+        if plate and self.is_blacklisted(plate):
+            return "BLACKLISTED", (0, 0, 255), f"{plate} | BLACKLISTED | {speed} km/h"  # RED
+        if speed > threshold_speed:
+            return "OVER SPEED", (255, 0, 0), f"{plate} | OVER SPEED | {speed} km/h"  # BLUE
+        return "", (0, 128, 0), f"{plate} | {speed} km/h"  # DARK GREEN
+
+    def log_best_read(self, track_id, threshold_speed, current_time):
+        """Log a track that ends before its plate is settled, with the best read so far."""
+        track = self.track_store.get(track_id)
+        plate = self.plates.plate(track_id)
+        if track is None or track.logged or not plate or track.speed is None:
+            return
+        status = self.classify(plate, track.speed, threshold_speed)[0]
+        self.log_detection(track_id, track, plate, status, current_time)
+
+    def log_detection(self, track_id, track, plate, status, current_time):
+        """Write one row per track (or hand it to the sink) and alert on violations."""
+        if status == "BLACKLISTED":
+            logger.warning(f"BLACKLIST DETECTED: {plate}")
+        if self.detection_sink is not None:
+            self.detection_sink({
+                "frame_idx": self.frame_idx,
+                "date": current_time.strftime("%Y-%m-%d"),
+                "time": current_time.strftime("%H:%M:%S"),
+                "track_id": track_id,
+                "class_name": track.class_name,
+                "speed": track.speed,
+                "numberplate": plate,
+                "status": status
+            })
+        elif self.record:
+            self.save_to_database(
+                current_time.strftime("%Y-%m-%d"),
+                current_time.strftime("%H:%M:%S"),
+                track_id,
+                track.class_name,
+                track.speed,
+                plate,
+                status
+            )
+            # Send email if the vehicle is blacklisted or overspeeding
+            if status in ["BLACKLISTED", "OVER SPEED"]:
+                self.send_email(plate, track.speed, status)
+        track.logged = True
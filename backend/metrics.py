@@ -0,0 +1,30 @@
+# Prometheus metrics for the processing hot path, served on /metrics. They cover this
+# process only: sharded segments run in worker processes and are not counted here.
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets from 1 ms to 10 s, covering a single decode up to a slow OCR batch or DB flush
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+FRAMES_PROCESSED = Counter("vehicle_frames_processed_total", "Frames run through detection and tracking")
+FRAMES_WRITTEN = Counter("vehicle_frames_written_total", "Annotated frames written to output videos")
+
+STAGE_SECONDS = Histogram("vehicle_stage_seconds", "Time spent per pipeline stage call", ["stage"],
+                          buckets=LATENCY_BUCKETS)
+DECODE = STAGE_SECONDS.labels("decode")
+TRACKING = STAGE_SECONDS.labels("tracking")
+OCR = STAGE_SECONDS.labels("ocr")
+ANNOTATION = STAGE_SECONDS.labels("annotation")
+ENCODE = STAGE_SECONDS.labels("encode")
+
+OCR_CALLS = Counter("vehicle_ocr_batches_total", "Batched OCR recognition calls")
+OCR_CROPS = Counter("vehicle_ocr_crops_total", "Plate crops sent to OCR")
+PLATES_LOCATED = Counter("vehicle_plates_located_total", "Vehicle boxes by plate localisation outcome", ["outcome"])
+OCR_CACHE_HITS = Counter("vehicle_ocr_cache_hits_total", "Tracks whose plate was served from the plate cache")
+
+DB_SECONDS = Histogram("vehicle_db_query_seconds", "MySQL round trips by operation", ["operation"],
+                       buckets=LATENCY_BUCKETS)
+DB_ERRORS = Counter("vehicle_db_errors_total", "Failed MySQL operations", ["operation"])
+DB_WRITER_QUEUE = Gauge("vehicle_db_writer_queue_depth", "Detection rows waiting to be written")
+
+ALERT_QUEUE = Gauge("vehicle_alert_queue_depth", "Violation alerts waiting to be e-mailed")
+ALERTS = Counter("vehicle_alerts_total", "Violation alerts by outcome", ["outcome"])
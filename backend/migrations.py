@@ -0,0 +1,25 @@
+"""Schema the app needs beyond ``my_data``: the stats rollups and the ``my_data`` indexes.
+
+app.py runs ``migrate`` once at startup, before it serves requests; request
+handlers and the detection writer never run DDL. Until one run has finished backfilling
+the rollups from ``my_data`` (recorded in ``schema_migrations``), every run
+rebuilds them, which can take a while on a large table, so run it on its own
+first when upgrading:
+
+    python migrations.py
+"""
+import db
+import detections
+import rollups
+
+
+def migrate():
+    """Create missing tables and indexes; safe to run again."""
+    with db.connection() as conn:
+        rollups.ensure_schema(conn)
+        detections.ensure_indexes(conn)
+
+
+if __name__ == "__main__":
+    migrate()
+    print("Schema up to date")
@@ -0,0 +1,116 @@
+import threading
+from time import perf_counter
+
+import numpy as np
+from paddleocr import PaddleOCR
+from ultralytics import YOLO
+
+_lock = threading.Lock()
+_idle = {}  # model path -> YOLO instances no job is using
+_checked_out = {}  # id of a YOLO instance in use -> its model path
+_ocr = None
+
+
+class SharedOCR:
+    """PaddleOCR instance shared by every estimator in the process.
+
+    Paddle inference predictors are not safe to run from several threads at
+    once, so ``ocr`` calls are serialised; other attributes pass through.
+    """
+
+    def __init__(self, ocr):
+        self._ocr = ocr
+        self._lock = threading.Lock()
+
+    def ocr(self, *args, **kwargs):
+        with self._lock:
+            return self._ocr.ocr(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._ocr, name)
+
+
+class Detector(YOLO):
+    """YOLO model that prints as its weights path.
+
+    Estimators hand it to BaseSolution as ``model``, which logs its whole
+    config; the default repr would print every layer of the network.
+    """
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.model_name!r})"
+
+
+def detector_for_job(model_path):
+    """Check out a YOLO instance for one job, stream or shard; give it back with ``release_detector``.
+
+    No instance is ever used by two jobs at once, so inference never runs the
+    same network from several threads. Released instances are reused, keeping
+    their warmed-up predictor, so weights are loaded once per concurrently
+    running job rather than once per job. The tracker state of a reused
+    instance is cleared on checkout.
+    """
+    with _lock:
+        idle = _idle.get(model_path)
+        detector = idle.pop() if idle else None
+    if detector is None:
+        detector = Detector(model_path)
+    else:
+        reset_tracker(detector)
+    with _lock:
+        _checked_out[id(detector)] = model_path
+    return detector
+
+
+def release_detector(detector):
+    """Return a detector from ``detector_for_job`` to the idle pool."""
+    if detector is None:
+        return
+    with _lock:
+        model_path = _checked_out.pop(id(detector), None)
+        if model_path is not None:
+            _idle.setdefault(model_path, []).append(detector)
+
+
+def reset_tracker(detector):
+    """Forget the tracks of the previous job while keeping the predictor and its callbacks."""
+    predictor = detector.predictor
+    for tracker in getattr(predictor, "trackers", None) or []:
+        # Not tracker.reset(): that also resets the track ID counter shared by every job
+        tracker.tracked_stracks, tracker.lost_stracks, tracker.removed_stracks = [], [], []
+        tracker.frame_id = 0
+
+
+def get_ocr():
+    """Create the PaddleOCR engine once per process."""
+    global _ocr
+    with _lock:
+        if _ocr is None:
+            _ocr = SharedOCR(PaddleOCR(use_angle_cls=True, lang='en'))
+        return _ocr
+
+
+def preload(model_path, frame_size=(640, 640)):
+    """Load and warm up the detector and OCR; returns timings in seconds."""
+    timings = {}
+    start = perf_counter()
+    detector = detector_for_job(model_path)
+    timings["detector_load"] = perf_counter() - start
+
+    start = perf_counter()
+    ocr = get_ocr()
+    timings["ocr_load"] = perf_counter() - start
+
+    # The first inference builds the predictor, fuses layers and initialises the backends
+    frame = np.zeros((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+    start = perf_counter()
+    detector.predict(frame, verbose=False)
+    timings["detector_warmup"] = perf_counter() - start
+
+    start = perf_counter()
+    ocr.ocr(np.full((48, 160, 3), 255, dtype=np.uint8), rec=True)
+    timings["ocr_warmup"] = perf_counter() - start
+
+    # Warmed up, so the first job starts with it
+    release_detector(detector)
+    return timings
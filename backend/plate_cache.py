@@ -0,0 +1,106 @@
+from collections import Counter
+
+
+class PlateRead:
+    """OCR reads collected for a single track."""
+
+    __slots__ = ("votes", "confidence", "reads", "last_attempt", "last_seen", "confirmed")
+
+    def __init__(self):
+        self.votes = Counter()  # plate text -> number of reads
+        self.confidence = {}  # plate text -> summed confidence
+        self.reads = 0
+        self.last_attempt = None
+        self.last_seen = None
+        self.confirmed = False
+
+    def best(self):
+        if not self.votes:
+            return "", 0.0
+        text, count = self.votes.most_common(1)[0]
+        return text, self.confidence[text] / count
+
+
+class PlateCache:
+    """Per-track plate cache with vote based confirmation.
+
+    OCR runs on a track until its plate is confirmed, either by the same text
+    being read ``confirm_votes`` times or by its mean confidence reaching
+    ``confirm_confidence`` over at least ``min_reads`` reads. While unconfirmed,
+    a track is re-read at most once every ``retry_interval`` frames and gives up
+    after ``max_reads`` attempts. Tracks not seen for ``ttl_frames`` are evicted.
+    """
+
+    def __init__(self, confirm_votes=3, confirm_confidence=0.9, min_reads=2,
+                 max_reads=10, retry_interval=5, ttl_frames=30):
+        self.confirm_votes = confirm_votes
+        self.confirm_confidence = confirm_confidence
+        self.min_reads = min_reads
+        self.max_reads = max_reads
+        self.retry_interval = retry_interval
+        self.ttl_frames = ttl_frames
+        self.tracks = {}
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def needs_ocr(self, track_id, frame_idx):
+        entry = self.tracks.get(track_id)
+        if entry is None:
+            return True
+        if entry.confirmed or entry.reads >= self.max_reads:
+            return False
+        return entry.last_attempt is None or frame_idx - entry.last_attempt >= self.retry_interval
+
+    def mark_attempt(self, track_id, frame_idx):
+        """Record that a crop was queued for OCR so it is not re-queued before the retry interval."""
+        entry = self.tracks.setdefault(track_id, PlateRead())
+        entry.last_attempt = frame_idx
+        entry.last_seen = frame_idx
+
+    def add_read(self, track_id, text, confidence, frame_idx):
+        entry = self.tracks.setdefault(track_id, PlateRead())
+        entry.reads += 1
+        if entry.last_attempt is None:
+            entry.last_attempt = frame_idx
+        entry.last_seen = frame_idx
+        if not text:
+            return
+        entry.votes[text] += 1
+        entry.confidence[text] = entry.confidence.get(text, 0.0) + confidence
+
+        best_text, best_confidence = entry.best()
+        votes = entry.votes[best_text]
+        if votes >= self.confirm_votes or (
+                votes >= self.min_reads and best_confidence >= self.confirm_confidence):
+            entry.confirmed = True
+
+    def plate(self, track_id):
+        entry = self.tracks.get(track_id)
+        return entry.best()[0] if entry else ""
+
+    def is_confirmed(self, track_id):
+        entry = self.tracks.get(track_id)
+        return bool(entry and entry.confirmed)
+
+    def is_settled(self, track_id):
+        """True once the plate is confirmed or no more OCR attempts will be made."""
+        entry = self.tracks.get(track_id)
+        return bool(entry and (entry.confirmed or entry.reads >= self.max_reads))
+
+    def touch(self, track_ids, frame_idx):
+        for track_id in track_ids:
+            entry = self.tracks.get(track_id)
+            if entry is not None:
+                entry.last_seen = frame_idx
+
+    def stale(self, frame_idx):
+        """Tracks ``evict_stale`` would remove at ``frame_idx``."""
+        return [track_id for track_id, entry in self.tracks.items()
+                if frame_idx - entry.last_seen > self.ttl_frames]
+
+    def evict_stale(self, frame_idx):
+        stale = self.stale(frame_idx)
+        for track_id in stale:
+            del self.tracks[track_id]
+        return len(stale)
@@ -0,0 +1,104 @@
+import cv2
+
+import metrics
+
+
+class PlateLocator:
+    """Finds the number plate inside a vehicle box and cuts it into normalized text lines.
+
+    With ``detector`` (a YOLO model trained on plates) the plate is the most
+    confident detection in the vehicle box; without one, a morphological
+    search picks the plate-shaped region of dark characters on a light
+    background, preferring the lower part of the vehicle. The plate is taken
+    as a view of the frame and only the resized lines are new arrays, so no
+    frame copy is made. Plates narrower than ``two_line_aspect`` are split
+    into a top and bottom row. Every line is scaled to ``height`` pixels, the
+    input height of PaddleOCR's recogniser, so it can skip text detection.
+    """
+
+    def __init__(self, detector=None, height=48, max_width=320, min_aspect=1.5, max_aspect=7.0,
+                 two_line_aspect=2.8, min_conf=0.25):
+        self.detector = detector
+        self.height = height
+        self.max_width = max_width
+        self.min_aspect = min_aspect
+        self.max_aspect = max_aspect
+        self.two_line_aspect = two_line_aspect
+        self.min_conf = min_conf
+
+    def locate(self, frame, box):
+        """Plate box (x1, y1, x2, y2) in frame coordinates, or None if none is found."""
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = box
+        x1, x2 = max(0, int(x1)), min(width, int(x2))
+        y1, y2 = max(0, int(y1)), min(height, int(y2))
+        if x2 - x1 < 16 or y2 - y1 < 16:
+            return None
+        vehicle = frame[y1:y2, x1:x2]
+        plate = self._detect(vehicle) if self.detector is not None else self._search(vehicle)
+        if plate is None:
+            return None
+        px1, py1, px2, py2 = plate
+        return x1 + px1, y1 + py1, x1 + px2, y1 + py2
+
+    def plate_lines(self, frame, box):
+        """Normalized line images of the plate in ``box``, or None if no plate is found."""
+        plate_box = self.locate(frame, box)
+        if plate_box is None:
+            metrics.PLATES_LOCATED.labels("missed").inc()
+            return None
+        metrics.PLATES_LOCATED.labels("located").inc()
+        x1, y1, x2, y2 = plate_box
+        return self.normalize(frame[y1:y2, x1:x2])
+
+    def normalize(self, plate):
+        height, width = plate.shape[:2]
+        if width < self.two_line_aspect * height:
+            rows = [plate[:height // 2], plate[height // 2:]]
+        else:
+            rows = [plate]
+        lines = []
+        for row in rows:
+            row_height, row_width = row.shape[:2]
+            if not row_height or not row_width:
+                continue
+            scale = self.height / row_height
+            size = (max(1, min(self.max_width, round(row_width * scale))), self.height)
+            lines.append(cv2.resize(row, size, interpolation=cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA))
+        return lines or None
+
+    def _detect(self, vehicle):
+        boxes = self.detector.predict(vehicle, conf=self.min_conf, verbose=False)[0].boxes
+        if not len(boxes):
+            return None
+        best = int(boxes.conf.argmax())
+        return tuple(int(v) for v in boxes.xyxy[best].tolist())
+
+    def _search(self, vehicle):
+        height, width = vehicle.shape[:2]
+        gray = cv2.cvtColor(vehicle, cv2.COLOR_BGR2GRAY)
+        # Characters are about a tenth of the plate width; size the kernels to the vehicle
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, width // 12), max(3, height // 24)))
+        blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel)
+        gradient = cv2.convertScaleAbs(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=3))
+        gradient = cv2.morphologyEx(cv2.GaussianBlur(gradient, (5, 5), 0), cv2.MORPH_CLOSE, kernel)
+        _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        mask = cv2.dilate(cv2.erode(mask, None, iterations=2), None, iterations=2)
+
+        best, best_score = None, 0.0
+        for contour in cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]:
+            x, y, w, h = cv2.boundingRect(contour)
+            if not h or not self.min_aspect <= w / h <= self.max_aspect:
+                continue
+            area = w * h / (width * height)
+            if not 0.005 <= area <= 0.3:
+                continue
+            # Larger and lower regions are more likely to be the plate than badges or signs
+            score = w * h * (0.5 + (y + h / 2) / height)
+            if score > best_score:
+                best, best_score = (x, y, w, h), score
+        if best is None:
+            return None
+        x, y, w, h = best
+        pad_x, pad_y = w // 20 + 1, h // 8 + 1
+        return max(0, x - pad_x), max(0, y - pad_y), min(width, x + w + pad_x), min(height, y + h + pad_y)
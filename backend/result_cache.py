@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+
+class HashingFile:
+    """Upload target that writes to a temporary file in ``directory`` and hashes it on the way.
+
+    ``store`` moves the finished upload to ``<sha256><ext>``, so identical
+    uploads share one file. Closing it before ``store`` deletes the
+    temporary file.
+    """
+
+    def __init__(self, directory):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self.file = os.fdopen(fd, "wb+")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.stored_path = None
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def store(self, filename=""):
+        """Move the upload to its content address; returns (sha256 hex, path)."""
+        self.file.close()
+        digest = self.sha256.hexdigest()
+        extension = os.path.splitext(secure_filename(filename or ""))[1].lower()
+        path = os.path.join(os.path.dirname(self.path), digest + extension)
+        if os.path.exists(path):
+            os.remove(self.path)
+            os.utime(path)  # Uploaded again, so recently used
+        else:
+            os.replace(self.path, path)
+        self.stored_path = path
+        return digest, path
+
+    def close(self):
+        self.file.close()
+        if self.stored_path is None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def store_upload(file, directory, chunk_size=1024 * 1024):
+    """Save an uploaded ``FileStorage`` by content hash; returns (sha256 hex, path).
+
+    Uploads parsed into a ``HashingFile`` are already on disk and hashed, so
+    they are only renamed; any other stream is copied and hashed in chunks.
+    """
+    target = file.stream
+    if not isinstance(target, HashingFile) or target.stored_path is not None:
+        target = HashingFile(directory)
+        try:
+            shutil.copyfileobj(file.stream, target, chunk_size)
+        except Exception:
+            target.close()
+            raise
+    return target.store(file.filename)
+
+
+class ResultCache:
+    """Processed videos keyed by upload hash and processing options, capped by size.
+
+    An entry is ``<key>.mp4`` plus ``<key>.json`` with its detection summary.
+    Everything else in ``directory`` is grouped by the name before its first
+    dot, and once the directory grows past ``max_bytes`` the least recently
+    used groups are removed, skipping keys of jobs still running.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @staticmethod
+    def key(content_hash, options, **extra):
+        """Cache key of an upload processed with ``options`` (and anything else that changes the result)."""
+        params = json.dumps({"options": options, **extra}, sort_keys=True, default=str)
+        return hashlib.sha256(f"{content_hash}:{params}".encode()).hexdigest()
+
+    def result_path(self, key):
+        return os.path.join(self.directory, f"{key}.mp4")
+
+    def get(self, key):
+        """The cached entry for ``key``, marked as recently used, or None."""
+        meta_path = os.path.join(self.directory, f"{key}.json")
+        with self.lock:
+            try:
+                with open(meta_path) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            if not os.path.exists(os.path.join(self.directory, entry["result_video"])):
+                self.misses += 1
+                return None
+            os.utime(meta_path)
+            self.hits += 1
+            return entry
+
+    def put(self, key, result_path, keep=(), **details):
+        """Record a finished result, then evict down to the size cap."""
+        entry = {
+            "key": key,
+            "result_video": os.path.relpath(result_path, self.directory).replace(os.sep, "/"),
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **details
+        }
+        meta_path = os.path.join(self.directory, f"{key}.json")
+        with self.lock:
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(entry, f)
+            os.replace(meta_path + ".tmp", meta_path)
+        self.evict(keep={key, *keep})
+        return entry
+
+    def evict(self, keep=()):
+        """Remove least recently used groups until the directory fits ``max_bytes``; returns bytes freed."""
+        with self.lock:
+            freed, removed = evict_groups(self.directory, self.max_bytes, keep)
+            self.evicted += removed
+            return freed
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+                    "bytes": directory_size(self.directory), "max_bytes": self.max_bytes}
+
+
+class UploadStore:
+    """Uploads kept under their content hash, capped by size.
+
+    Once ``directory`` grows past ``max_bytes`` the least recently uploaded
+    videos are removed, skipping inputs of jobs still queued or running and
+    uploads still being received (``.part`` files).
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def evict(self, keep=()):
+        """Evict down to the size cap; ``keep`` holds paths that must stay. Returns bytes freed."""
+        with self.lock:
+            stems = {os.path.basename(path).split(".", 1)[0] for path in keep}
+            stems.update(name.split(".", 1)[0] for name in os.listdir(self.directory) if name.endswith(".part"))
+            freed, removed = evict_groups(self.directory, self.max_bytes, stems)
+            self.evicted += removed
+            return freed
+
+    def stats(self):
+        with self.lock:
+            return {"evicted": self.evicted, "bytes": directory_size(self.directory), "max_bytes": self.max_bytes}
+
+
+def evict_groups(directory, max_bytes, keep=()):
+    """Remove the least recently used entries of ``directory`` until it fits ``max_bytes``.
+
+    Entries are grouped by the name before their first dot and removed a
+    group at a time; groups named in ``keep`` stay. Returns (bytes freed,
+    groups removed).
+    """
+    groups = {}
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        size, last_used = usage(path)
+        stem = name.split(".", 1)[0]
+        group = groups.setdefault(stem, {"paths": [], "size": 0, "last_used": 0.0})
+        group["paths"].append(path)
+        group["size"] += size
+        group["last_used"] = max(group["last_used"], last_used)
+
+    total = sum(group["size"] for group in groups.values())
+    freed, removed = 0, 0
+    for stem, group in sorted(groups.items(), key=lambda item: item[1]["last_used"]):
+        if total - freed <= max_bytes:
+            break
+        if stem in keep:
+            continue
+        for path in group["paths"]:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Cache eviction error: {str(e)}")
+        freed += group["size"]
+        removed += 1
+    return freed, removed
+
+
+def directory_size(directory):
+    return sum(usage(os.path.join(directory, name))[0] for name in os.listdir(directory))
+
+
+def usage(path):
+    """(bytes, newest mtime) of a file or of every file under a directory."""
+    if os.path.isdir(path):
+        paths = [os.path.join(root, name) for root, _, files in os.walk(path) for name in files]
+    else:
+        paths = [path]
+    size, last_used = 0, 0.0
+    for file_path in paths:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue  # Removed while scanning
+        size += stat.st_size
+        last_used = max(last_used, stat.st_mtime)
+    return size, last_used
@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+# Statuses counted as violations for the top violators list
+VIOLATION_STATUSES = ("OVER SPEED", "BLACKLISTED")
+# Width of stats_violators.numberplate; longer plates are counted under their first characters
+PLATE_LENGTH = 255
+# schema_migrations row written in the transaction that finishes the backfill
+BACKFILL_MARKER = "rollups_backfill"
+
+
+def ensure_index(cursor, table, name, columns):
+    """Create an index unless it exists (MySQL has no CREATE INDEX IF NOT EXISTS)."""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, name))
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+
+def drop_index(cursor, table, name):
+    """Drop an index if it exists."""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, name))
+    if cursor.fetchone()[0]:
+        cursor.execute(f"DROP INDEX {name} ON {table}")
+
+
+def column_length(cursor, table, column):
+    cursor.execute("""
+        SELECT CHARACTER_MAXIMUM_LENGTH FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def ensure_schema(connection):
+    """Create the rollup tables and indexes; part of the startup migration (see migrations.py).
+
+    Until the backfill marker is in ``schema_migrations`` the rollups are
+    rebuilt from ``my_data``; from then on the detection writer keeps them up
+    to date. CREATE TABLE and CREATE INDEX commit on their own, but the
+    rebuild and its marker commit together, so a run that fails or is
+    interrupted part way is redone in full next time.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name VARCHAR(64) NOT NULL PRIMARY KEY,
+                applied_at DATETIME NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stats_daily (
+                day DATE NOT NULL,
+                status VARCHAR(32) NOT NULL,
+                vehicles BIGINT NOT NULL DEFAULT 0,
+                speed_sum DOUBLE NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, status)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS stats_violators (
+                numberplate VARCHAR({PLATE_LENGTH}) NOT NULL PRIMARY KEY,
+                violation_count BIGINT NOT NULL DEFAULT 0,
+                INDEX idx_violation_count (violation_count)
+            )
+        """)
+        # Tables created with the first, too narrow, plate column
+        if (column_length(cursor, "stats_violators", "numberplate") or PLATE_LENGTH) < PLATE_LENGTH:
+            cursor.execute(f"ALTER TABLE stats_violators MODIFY numberplate VARCHAR({PLATE_LENGTH}) NOT NULL")
+        ensure_index(cursor, "my_data", "idx_my_data_date", "date")
+        # Created by earlier versions for the backfill; nothing queries it
+        drop_index(cursor, "my_data", "idx_my_data_status_plate")
+
+        cursor.execute("SELECT COUNT(*) FROM schema_migrations WHERE name = %s", (BACKFILL_MARKER,))
+        if not cursor.fetchone()[0]:
+            # Whatever an earlier attempt left behind is counted again below
+            cursor.execute("DELETE FROM stats_daily")
+            cursor.execute("DELETE FROM stats_violators")
+            cursor.execute("""
+                INSERT INTO stats_daily (day, status, vehicles, speed_sum)
+                SELECT date, COALESCE(status, ''), COUNT(*), COALESCE(SUM(speed), 0)
+                FROM my_data GROUP BY date, COALESCE(status, '')
+            """)
+            cursor.execute(f"""
+                INSERT INTO stats_violators (numberplate, violation_count)
+                SELECT LEFT(numberplate, {PLATE_LENGTH}), COUNT(*) FROM my_data
+                WHERE status IN ('OVER SPEED', 'BLACKLISTED') AND numberplate IS NOT NULL
+                GROUP BY LEFT(numberplate, {PLATE_LENGTH})
+            """)
+            cursor.execute("INSERT INTO schema_migrations (name, applied_at) VALUES (%s, NOW())",
+                           (BACKFILL_MARKER,))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def update_rollups(cursor, rows):
+    """Add ``my_data`` rows to the rollups; run in the transaction that inserts the rows.
+
+    Rows are (date, time, track_id, class_name, speed, numberplate, status).
+    """
+    daily = defaultdict(lambda: [0, 0.0])
+    violators = defaultdict(int)
+    for date, _, _, _, speed, numberplate, status in rows:
+        totals = daily[(date, status or "")]
+        totals[0] += 1
+        totals[1] += float(speed or 0)
+        if status in VIOLATION_STATUSES:
+            violators[(numberplate or "")[:PLATE_LENGTH]] += 1
+
+    cursor.executemany("""
+        INSERT INTO stats_daily (day, status, vehicles, speed_sum) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE vehicles = vehicles + VALUES(vehicles), speed_sum = speed_sum + VALUES(speed_sum)
+    """, [(day, status, count, speed_sum) for (day, status), (count, speed_sum) in daily.items()])
+    if violators:
+        cursor.executemany("""
+            INSERT INTO stats_violators (numberplate, violation_count) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE violation_count = violation_count + VALUES(violation_count)
+        """, list(violators.items()))
+
+
+def load_stats(connection):
+    """Dashboard totals from the rollup tables; cost does not grow with ``my_data``."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT COALESCE(SUM(vehicles), 0) AS total_vehicles,
+                   COALESCE(SUM(speed_sum), 0) AS speed_sum,
+                   COALESCE(SUM(CASE WHEN status = 'OVER SPEED' THEN vehicles ELSE 0 END), 0) AS overspeeding,
+                   COALESCE(SUM(CASE WHEN status = 'BLACKLISTED' THEN vehicles ELSE 0 END), 0) AS blacklisted
+            FROM stats_daily
+        """)
+        totals = cursor.fetchone()
+
+        # Top 5 violators
+        cursor.execute("""
+            SELECT numberplate, violation_count
+            FROM stats_violators
+            ORDER BY violation_count DESC
+            LIMIT 5
+        """)
+        top_violators = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    total_vehicles = int(totals["total_vehicles"])
+    return {
+        "total_vehicles": total_vehicles,
+        "average_speed": round(float(totals["speed_sum"]) / total_vehicles, 2) if total_vehicles else 0.0,
+        "overspeeding": int(totals["overspeeding"]),
+        "blacklisted": int(totals["blacklisted"]),
+        "top_violators": [{"numberplate": row["numberplate"], "violation_count": int(row["violation_count"])}
+                          for row in top_violators]
+    }
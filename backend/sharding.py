@@ -0,0 +1,246 @@
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+import models
+from config import SHARD_PROCESSES, DEFAULT_METERS_PER_PIXEL
+from db_writer import get_writer
+from alerts import send_violation_email
+from blacklist_index import blacklist
+from cache import settings
+from main import SpeedEstimator, get_threshold_speed, load_blacklist
+from summary import DetectionSummary
+from video_pipeline import read_frames, infer_frames, concatenate
+
+# Minimum mean IoU over the overlap for two tracks to be treated as the same vehicle
+STITCH_IOU = 0.5
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process pool reused across jobs so each worker loads the models only once."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers: forking a process that already runs torch/paddle threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=SHARD_PROCESSES,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def plan_segments(total_frames, shards, overlap, stride=1):
+    """Split ``total_frames`` into (warmup_start, start, end) frame ranges, 0-based.
+
+    Each segment writes frames [start, end) but starts inference ``overlap``
+    frames earlier (aligned to a keyframe) so its tracker is warm and its
+    tracks can be matched with the previous segment's. The last segment
+    reads to the end of the file (``end`` is None).
+    """
+    length = -(-total_frames // shards)
+    segments = []
+    for index in range(shards):
+        start = index * length
+        if start >= total_frames:
+            break
+        end = min(total_frames, start + length) if index < shards - 1 else None
+        warmup_start = max(0, (start - overlap) // stride * stride)
+        segments.append((warmup_start, start, end))
+    if segments:
+        segments[-1] = (segments[-1][0], segments[-1][1], None)
+    return segments
+
+
+def process_segment(task):
+    """Worker entry point: process one segment and write its frames to ``task['part_path']``."""
+    cap = cv2.VideoCapture(task["input_path"])
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, task["warmup_start"])
+    out_writer = cv2.VideoWriter(task["part_path"], cv2.VideoWriter_fourcc(*"mp4v"), int(fps) or 30, (width, height))
+
+    rows = []
+    estimator = SpeedEstimator(
+        region=task["region"],
+        model=task["model_path"],
+        detector=models.detector_for_job(task["model_path"]),
+        ocr=models.get_ocr(),
+        roi=task["roi"],
+        fps=fps,
+        meters_per_pixel=task["meters_per_pixel"],
+        detection_sink=rows.append,  # The parent deduplicates rows across segments first
+        threshold_speed=task["threshold_speed"],  # Resolved by the parent: workers never open MySQL
+        blacklist_plates=task["blacklist"],
+        line_width=2
+    )
+
+    start, end, overlap = task["start"], task["end"], task["overlap"]
+    frames = read_frames(cap)
+    if end is not None:
+        frames = itertools.islice(frames, end - task["warmup_start"])
+
+    summary = DetectionSummary()
+    head, tail = {}, {}  # frame position -> [(track_id, box)] used for stitching
+    frames_written = 0
+    try:
+        results_stream = infer_frames(frames, estimator, task["stride"], summary, start=task["warmup_start"] + 1)
+        for position, (frame, results) in enumerate(results_stream, start=task["warmup_start"]):
+            keyframe = [(r["track_id"], r["box"]) for r in results if not r.get("interpolated")]
+            if position < start:
+                head[position] = keyframe
+                continue
+            if end is not None and position >= end - overlap:
+                tail[position] = keyframe
+            out_writer.write(estimator.annotate(frame, results))
+            frames_written += 1
+        estimator.finish()
+    finally:
+        estimator.release()
+        cap.release()
+        out_writer.release()
+
+    return {
+        "index": task["index"],
+        "part_path": task["part_path"],
+        "frames_written": frames_written,
+        "head": head,
+        "tail": tail,
+        "rows": rows,
+        "tracks": summary.tracks
+    }
+
+
+def iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_tracks(tail, head):
+    """Map track IDs of the next segment to the previous one by mean IoU over shared frames."""
+    scores = {}
+    for position in set(tail) & set(head):
+        for prev_id, prev_box in tail[position]:
+            for next_id, next_box in head[position]:
+                overlap = iou(prev_box, next_box)
+                if overlap > 0:
+                    scores.setdefault((prev_id, next_id), []).append(overlap)
+    frames = max(1, len(set(tail) & set(head)))
+    pairs = sorted(((sum(values) / frames, prev_id, next_id) for (prev_id, next_id), values in scores.items()),
+                   reverse=True)
+    matches, used_prev = {}, set()
+    for score, prev_id, next_id in pairs:
+        if score < STITCH_IOU or next_id in matches or prev_id in used_prev:
+            continue
+        matches[next_id] = prev_id
+        used_prev.add(prev_id)
+    return matches
+
+
+def stitch(segments):
+    """Assign global track IDs across segments; returns {(segment index, local id): global id}."""
+    global_ids = {}
+    next_global = itertools.count(1)
+    previous = None
+    for segment in segments:
+        matches = match_tracks(previous["tail"], segment["head"]) if previous else {}
+        local_ids = set(segment["tracks"]) | {row["track_id"] for row in segment["rows"]}
+        for local_id in sorted(local_ids):
+            if local_id in matches:
+                global_ids[(segment["index"], local_id)] = global_ids[(previous["index"], matches[local_id])]
+            else:
+                global_ids[(segment["index"], local_id)] = next(next_global)
+        previous = segment
+    return global_ids
+
+
+def process_sharded(input_path, output_path, model_path, region, shards, overlap_seconds,
+                    stride=1, roi=None, meters_per_pixel=DEFAULT_METERS_PER_PIXEL, summary=None, progress_callback=None):
+    """Process a long video as overlapping time segments in a process pool.
+
+    Segment outputs are concatenated into ``output_path``; detection rows are
+    deduplicated by stitched track ID and written once by this process.
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        print("Error: Unable to open video file.")
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    overlap = max(1, int(round(overlap_seconds * fps)))
+    base, _ = os.path.splitext(output_path)
+    # Read once here; each spawned worker would otherwise open its own connection pool
+    threshold_speed = settings.get("threshold_speed", get_threshold_speed)
+    blacklist.refresh_if_stale(load_blacklist)
+    blacklist_plates = sorted(blacklist.plates)
+    tasks = [{
+        "index": index,
+        "input_path": input_path,
+        "part_path": f"{base}.part{index}.mp4",
+        "model_path": model_path,
+        "region": region,
+        "roi": roi,
+        "stride": stride,
+        "meters_per_pixel": meters_per_pixel,
+        "threshold_speed": threshold_speed,
+        "blacklist": blacklist_plates,
+        "warmup_start": warmup_start,
+        "start": start,
+        "end": end,
+        "overlap": overlap
+    } for index, (warmup_start, start, end) in enumerate(plan_segments(total_frames, shards, overlap, stride))]
+
+    pool = get_pool()
+    results = []
+    frames_done = 0
+    try:
+        for future in as_completed([pool.submit(process_segment, task) for task in tasks]):
+            segment = future.result()
+            results.append(segment)
+            frames_done += segment["frames_written"]
+            if progress_callback:
+                progress_callback(frames_done, total_frames)
+        results.sort(key=lambda segment: segment["index"])
+        concatenate([segment["part_path"] for segment in results], output_path, int(fps) or 30, size)
+    finally:
+        for task in tasks:
+            if os.path.exists(task["part_path"]):
+                os.remove(task["part_path"])
+
+    global_ids = stitch(results)
+    write_detections(results, global_ids)
+    if summary is not None:
+        for segment in results:
+            for local_id, track in segment["tracks"].items():
+                merged = summary.tracks.setdefault(global_ids[(segment["index"], local_id)], dict(track))
+                for key in ("numberplate", "speed", "status"):
+                    merged[key] = merged[key] or track[key]
+    return output_path
+
+
+def write_detections(segments, global_ids):
+    """Write each stitched vehicle once, keeping the row from the earliest segment."""
+    writer = get_writer()
+    logged = set()
+    for segment in segments:
+        for row in sorted(segment["rows"], key=lambda row: row["frame_idx"]):
+            global_id = global_ids[(segment["index"], row["track_id"])]
+            if global_id in logged:
+                continue
+            logged.add(global_id)
+            writer.write((row["date"], row["time"], global_id, row["class_name"], row["speed"],
+                          row["numberplate"].replace(" ", ""), row["status"]))
+            if row["status"] in ["BLACKLISTED", "OVER SPEED"]:
+                send_violation_email(row["numberplate"], row["speed"], row["status"])
+    writer.flush()
@@ -0,0 +1,283 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from time import monotonic, sleep
+
+import cv2
+
+import models
+from config import DEFAULT_METERS_PER_PIXEL
+from main import SpeedEstimator
+
+
+def open_source(source):
+    """``cv2.VideoCapture`` for a URL, a file path or a device index given as a string."""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep the decoder from queueing old frames
+    return cap
+
+
+class FrameGrabber:
+    """Reads a stream on its own thread and keeps only the newest frame.
+
+    A frame that is replaced before the consumer takes it counts as dropped,
+    so a slow consumer always gets the most recent frame instead of falling
+    further behind. With ``replay=True`` a local file is read at its native
+    frame rate, as a camera would deliver it. Live sources are reopened after
+    ``reconnect_delay`` seconds when they stop delivering frames; the frame
+    index then skips the frames the outage lasted, so speeds and track
+    expiry stay in source time across the gap.
+    """
+
+    def __init__(self, source, replay=False, reconnect_delay=2.0):
+        self.source = source
+        self.replay = replay
+        self.reconnect_delay = reconnect_delay
+        self.cap = open_source(source)
+        if not self.cap.isOpened():
+            raise ValueError(f"Unable to open stream source: {source}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame = None  # (frame index, frame, monotonic capture time)
+        self.frame_idx = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.ended = False
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.read_times = deque(maxlen=30)
+        self.thread = threading.Thread(target=self._run, name="stream-reader", daemon=True)
+        self.thread.start()
+
+    def latest(self, timeout=1.0):
+        """Take the newest unread frame; None on timeout or once the source has ended."""
+        with self.cond:
+            if self.frame is None and not self.ended:
+                self.cond.wait(timeout)
+            item, self.frame = self.frame, None
+            return item
+
+    def input_fps(self):
+        with self.cond:
+            if len(self.read_times) < 2:
+                return 0.0
+            return (len(self.read_times) - 1) / max(self.read_times[-1] - self.read_times[0], 1e-6)
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        self.cap.release()
+
+    def _run(self):
+        started = monotonic()
+        last_read = None  # Capture time of the last frame before an outage
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    if self.replay or os.path.isfile(str(self.source)):
+                        break  # End of file
+                    print(f"Stream {self.source} stopped delivering frames, reconnecting")
+                    if last_read is None and self.read_times:
+                        last_read = self.read_times[-1]
+                    self.cap.release()
+                    self.stop_event.wait(self.reconnect_delay)
+                    self.cap = open_source(self.source)
+                    continue
+
+                with self.cond:
+                    now = monotonic()
+                    if last_read is not None:
+                        # Frames the camera produced while it was unreachable
+                        self.frame_idx += max(0, round((now - last_read) * self.fps) - 1)
+                        last_read = None
+                    self.frame_idx += 1
+                    self.frames_read += 1
+                    if self.frame is not None:
+                        self.frames_dropped += 1
+                    self.frame = (self.frame_idx, frame, now)
+                    self.read_times.append(now)
+                    self.cond.notify_all()
+
+                if self.replay:
+                    # Pace the file like a live camera
+                    delay = started + self.frames_read / self.fps - monotonic()
+                    if delay > 0:
+                        sleep(delay)
+        finally:
+            with self.cond:
+                self.ended = True
+                self.cond.notify_all()
+
+
+class StreamProcessor:
+    """Runs ``SpeedEstimator`` on the newest frame of a live source and publishes JPEGs.
+
+    Frame indices come from the reader, so speeds stay in source time when
+    frames are dropped. ``lag`` is the time from capturing a frame to
+    finishing its annotation.
+    """
+
+    RUNNING = "running"
+    STOPPED = "stopped"
+    FAILED = "failed"
+
+    def __init__(self, source, model_path, region, replay=False, roi=None, record=True,
+                 meters_per_pixel=DEFAULT_METERS_PER_PIXEL, jpeg_quality=80, reconnect_delay=2.0):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.jpeg_quality = jpeg_quality
+        self.grabber = FrameGrabber(source, replay=replay, reconnect_delay=reconnect_delay)
+        detector = None
+        try:
+            detector = models.detector_for_job(model_path)
+            self.estimator = SpeedEstimator(
+                region=region,
+                model=model_path,
+                detector=detector,
+                ocr=models.get_ocr(),
+                roi=roi,
+                record=record,
+                fps=self.grabber.fps,
+                meters_per_pixel=meters_per_pixel,
+                line_width=2
+            )
+        except Exception:
+            # Nothing will stop the reader or return the detector otherwise
+            self.grabber.stop()
+            models.release_detector(detector)
+            raise
+        self.options = {"replay": replay, "roi": roi, "record": record, "meters_per_pixel": meters_per_pixel}
+        self.state = StreamProcessor.RUNNING
+        self.error = None
+        self.started_at = datetime.now()
+        self.frames_processed = 0
+        self.last_frame_idx = 0
+        self.lag = 0.0
+        self.process_times = deque(maxlen=30)
+        self.jpeg = None
+        self.jpeg_seq = 0
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stream-infer", daemon=True)
+        self.thread.start()
+
+    @property
+    def active(self):
+        return self.state == StreamProcessor.RUNNING
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=10)
+
+    def frames(self, timeout=5.0):
+        """Yield each newly published JPEG until the stream stops; slow clients skip frames."""
+        seq = 0
+        while True:
+            with self.cond:
+                if self.jpeg_seq == seq and self.active:
+                    self.cond.wait(timeout)
+                if self.jpeg_seq == seq:
+                    if not self.active:
+                        return
+                    continue
+                seq, jpeg = self.jpeg_seq, self.jpeg
+            yield jpeg
+
+    def stats(self):
+        processed_fps = 0.0
+        if len(self.process_times) >= 2:
+            processed_fps = (len(self.process_times) - 1) / max(self.process_times[-1] - self.process_times[0], 1e-6)
+        return {
+            "frames_read": self.grabber.frames_read,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.grabber.frames_dropped,
+            "last_frame_idx": self.last_frame_idx,
+            "input_fps": round(self.grabber.input_fps(), 2),
+            "processed_fps": round(processed_fps, 2),
+            "lag_seconds": round(self.lag, 3)
+        }
+
+    def to_dict(self):
+        return {
+            "stream_id": self.id,
+            "source": self.source,
+            "state": self.state,
+            "options": self.options,
+            "stats": self.stats(),
+            "error": self.error,
+            "started_at": self.started_at.strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def _run(self):
+        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        try:
+            while not self.stop_event.is_set():
+                item = self.grabber.latest(timeout=1.0)
+                if item is None:
+                    if self.grabber.ended:
+                        break
+                    continue
+                frame_idx, frame, captured_at = item
+                results = self.estimator.process_frame(frame, frame_idx=frame_idx)
+                annotated = self.estimator.annotate(frame, results)
+                ok, jpeg = cv2.imencode(".jpg", annotated, encode_params)
+                now = monotonic()
+                self.lag = now - captured_at
+                self.frames_processed += 1
+                self.last_frame_idx = frame_idx
+                self.process_times.append(now)
+                if ok:
+                    with self.cond:
+                        self.jpeg = jpeg.tobytes()
+                        self.jpeg_seq += 1
+                        self.cond.notify_all()
+            self.estimator.finish()
+            self.state = StreamProcessor.STOPPED
+        except Exception as e:
+            print(f"Stream {self.id} failed: {str(e)}")
+            self.error = str(e)
+            self.state = StreamProcessor.FAILED
+        finally:
+            self.estimator.release()
+            self.grabber.stop()
+            with self.cond:
+                self.cond.notify_all()
+
+
+class StreamManager:
+    """Keeps the running streams, capped at ``max_streams`` active at once."""
+
+    def __init__(self, max_streams=4):
+        self.max_streams = max_streams
+        self.streams = OrderedDict()
+        self.lock = threading.Lock()
+
+    def start(self, source, model_path, region, **options):
+        with self.lock:
+            # Forget streams that have ended
+            for stream_id in [sid for sid, stream in self.streams.items() if not stream.active]:
+                del self.streams[stream_id]
+            if len(self.streams) >= self.max_streams:
+                raise RuntimeError(f"At most {self.max_streams} streams can run at once")
+            stream = StreamProcessor(source, model_path, region, **options)
+            self.streams[stream.id] = stream
+            return stream
+
+    def get(self, stream_id):
+        with self.lock:
+            return self.streams.get(stream_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.streams.values())
+
+    def stop(self, stream_id):
+        with self.lock:
+            stream = self.streams.pop(stream_id, None)
+        if stream:
+            stream.stop()
+        return stream
@@ -0,0 +1,59 @@
+class DetectionSummary:
+    """Per-track outcome of a processed video, built from the per-frame results."""
+
+    def __init__(self):
+        self.tracks = {}  # track_id -> latest result with a plate/speed
+
+    def add(self, results):
+        for result in results:
+            if result.get("interpolated"):
+                continue
+            track = self.tracks.setdefault(result["track_id"], {
+                "class_name": result["class_name"], "numberplate": "", "speed": 0, "status": ""
+            })
+            if result["numberplate"]:
+                track["numberplate"] = result["numberplate"]
+            if result["speed"]:
+                track["speed"] = result["speed"]
+            if result["status"]:
+                track["status"] = result["status"]
+
+    def plate_speeds(self):
+        """Speed per plate; a plate seen on several tracks keeps the first."""
+        speeds = {}
+        for track in self.tracks.values():
+            if track["numberplate"] and track["speed"]:
+                speeds.setdefault(track["numberplate"], track["speed"])
+        return speeds
+
+    def to_dict(self):
+        speeds = [track["speed"] for track in self.tracks.values() if track["speed"]]
+        return {
+            "vehicles": len(self.tracks),
+            "with_plate": sum(1 for track in self.tracks.values() if track["numberplate"]),
+            "average_speed": round(sum(speeds) / len(speeds), 2) if speeds else 0.0,
+            "overspeeding": sum(1 for track in self.tracks.values() if track["status"] == "OVER SPEED"),
+            "blacklisted": sum(1 for track in self.tracks.values() if track["status"] == "BLACKLISTED")
+        }
+
+
+def speed_drift(baseline, candidate):
+    """Compare speeds of a reduced-work run against a full-rate baseline run.
+
+    Vehicles are matched by plate text; unmatched vehicles only affect the
+    average speed and vehicle count deltas.
+    """
+    base_speeds = baseline.plate_speeds()
+    cand_speeds = candidate.plate_speeds()
+    matched = sorted(set(base_speeds) & set(cand_speeds))
+    abs_diffs = [abs(cand_speeds[plate] - base_speeds[plate]) for plate in matched]
+    rel_diffs = [diff / base_speeds[plate] for diff, plate in zip(abs_diffs, matched) if base_speeds[plate]]
+    base, cand = baseline.to_dict(), candidate.to_dict()
+    return {
+        "matched_vehicles": len(matched),
+        "mean_abs_speed_error": round(sum(abs_diffs) / len(abs_diffs), 2) if abs_diffs else None,
+        "max_abs_speed_error": round(max(abs_diffs), 2) if abs_diffs else None,
+        "mean_rel_speed_error": round(sum(rel_diffs) / len(rel_diffs), 4) if rel_diffs else None,
+        "average_speed_delta": round(cand["average_speed"] - base["average_speed"], 2),
+        "vehicle_count_delta": cand["vehicles"] - base["vehicles"]
+    }
@@ -0,0 +1,85 @@
+import math
+from array import array
+
+
+class TrackRecord:
+    """State of one track: a ring buffer of recent positions plus its speed and logging flags."""
+
+    __slots__ = ("samples", "head", "count", "speed", "logged", "last_seen", "class_name")
+
+    def __init__(self, window):
+        self.samples = array("d", bytes(8 * 3 * window))  # (video time, x, y) per slot
+        self.head = 0  # Next slot to write
+        self.count = 0
+        self.speed = None  # km/h once measured
+        self.logged = False
+        self.last_seen = 0
+        self.class_name = ""
+
+    def add(self, t, x, y):
+        window = len(self.samples) // 3
+        offset = self.head * 3
+        self.samples[offset] = t
+        self.samples[offset + 1] = x
+        self.samples[offset + 2] = y
+        self.head = (self.head + 1) % window
+        self.count = min(self.count + 1, window)
+
+    def full(self):
+        return self.count == len(self.samples) // 3
+
+    def oldest(self):
+        window = len(self.samples) // 3
+        offset = ((self.head - self.count) % window) * 3
+        return self.samples[offset], self.samples[offset + 1], self.samples[offset + 2]
+
+    def newest(self):
+        window = len(self.samples) // 3
+        offset = ((self.head - 1) % window) * 3
+        return self.samples[offset], self.samples[offset + 1], self.samples[offset + 2]
+
+
+class TrackStore:
+    """Per-track records for ``SpeedEstimator``, bounded by evicting stale tracks.
+
+    Each record keeps the last ``window`` (video time, center) samples in a
+    fixed array, so a track's memory does not grow with its age. Tracks not
+    seen for ``ttl_frames`` frames are evicted; keep this above the tracker's
+    own lost-track buffer so an evicted ID does not come back and get logged
+    twice.
+    """
+
+    def __init__(self, window=5, ttl_frames=150):
+        self.window = max(2, window)
+        self.ttl_frames = ttl_frames
+        self.tracks = {}
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def get(self, track_id):
+        return self.tracks.get(track_id)
+
+    def update(self, track_id, frame_idx, t, x, y, meters_per_pixel=1.0):
+        """Add a position and measure the speed once the window is full; returns the record."""
+        record = self.tracks.get(track_id)
+        if record is None:
+            record = self.tracks[track_id] = TrackRecord(self.window)
+        record.last_seen = frame_idx
+        record.add(t, x, y)
+
+        if record.speed is None and record.full():
+            start_time, start_x, start_y = record.oldest()
+            end_time, end_x, end_y = record.newest()
+            time_diff = end_time - start_time
+            if time_diff > 0:
+                distance_moved = math.hypot(end_x - start_x, end_y - start_y) * meters_per_pixel
+                record.speed = round((distance_moved / time_diff) * 3.6, 2)
+        return record
+
+    def evict_stale(self, frame_idx):
+        stale = [track_id for track_id, record in self.tracks.items()
+                 if frame_idx - record.last_seen > self.ttl_frames]
+        for track_id in stale:
+            del self.tracks[track_id]
+        return len(stale)
@@ -0,0 +1,215 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+import metrics
+from config import FFMPEG_PATH
+
+_DONE = object()
+
+
+def read_frames(cap):
+    while True:
+        with metrics.DECODE.time():
+            ret, frame = cap.read()
+        if not ret:
+            return
+        yield frame
+
+
+def ffmpeg_binary():
+    """Path of the ffmpeg used to join videos, or None when there is none."""
+    return FFMPEG_PATH or shutil.which("ffmpeg")
+
+
+def concatenate(part_paths, output_path, fps, size):
+    """Join the given videos, in order, into one file.
+
+    With ffmpeg the parts are stream-copied through its concat demuxer, so no
+    frame is encoded twice. Without it, or if ffmpeg fails, every frame is
+    decoded and re-encoded.
+    """
+    ffmpeg = ffmpeg_binary()
+    if ffmpeg:
+        fd, list_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), suffix=".txt")
+        try:
+            with os.fdopen(fd, "w") as f:
+                for part_path in part_paths:
+                    escaped = os.path.abspath(part_path).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                            "-i", list_path, "-c", "copy", output_path],
+                           check=True, capture_output=True)
+            return
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Stream copy failed, re-encoding: {getattr(e, 'stderr', b'') or e}")
+        finally:
+            os.remove(list_path)
+
+    out_writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    try:
+        for part_path in part_paths:
+            cap = cv2.VideoCapture(part_path)
+            for frame in read_frames(cap):
+                out_writer.write(frame)
+            cap.release()
+    finally:
+        out_writer.release()
+
+
+def interpolate_results(previous, current, t):
+    """Results for a skipped frame a fraction ``t`` of the way from ``previous`` to ``current``.
+
+    Tracks present in both keyframes get linearly interpolated boxes and the
+    newer labels; tracks that end at ``previous`` stay where they were last seen.
+    """
+    current_by_id = {result["track_id"]: result for result in current}
+    interpolated = []
+    for result in previous:
+        after = current_by_id.get(result["track_id"])
+        if after is None:
+            box, source = result["box"], result
+        else:
+            box = tuple(int(round(a + (b - a) * t)) for a, b in zip(result["box"], after["box"]))
+            source = after
+        interpolated.append({**source, "box": box, "interpolated": True})
+    return interpolated
+
+
+def infer_frames(frames, estimator, stride=1, summary=None, start=1):
+    """Yield (frame, results) in order, running inference on every ``stride``-th frame only.
+
+    Frames in between are held until the next keyframe has been processed and
+    then get boxes interpolated between the two keyframes. ``start`` is the
+    1-based index of the first frame in the video; it must fall on a keyframe.
+    """
+    previous = None
+    skipped = []
+    for frame_idx, frame in enumerate(frames, start=start):
+        if (frame_idx - 1) % stride:
+            skipped.append(frame)
+            continue
+
+        results = estimator.process_frame(frame, frame_idx=frame_idx)
+        if summary is not None:
+            summary.add(results)
+        for offset, skipped_frame in enumerate(skipped, start=1):
+            yield skipped_frame, interpolate_results(previous, results, offset / stride)
+        skipped = []
+        previous = results
+        yield frame, results
+
+    # Frames after the last keyframe keep its boxes
+    for skipped_frame in skipped:
+        yield skipped_frame, interpolate_results(previous, previous, 0.0)
+
+
+def run_sequential(cap, out_writer, estimator, progress_callback=None, total_frames=0,
+                   stride=1, summary=None):
+    """Decode, infer, annotate and encode each frame in turn on the calling thread.
+
+    ``out_writer`` may be None to analyse a video without writing one.
+    """
+    frames_done = 0
+    for frame, results in infer_frames(read_frames(cap), estimator, stride, summary):
+        processed_frame = estimator.annotate(frame, results) if out_writer is not None else None
+        if processed_frame is not None and isinstance(processed_frame, np.ndarray):
+            with metrics.ENCODE.time():
+                out_writer.write(processed_frame)
+            metrics.FRAMES_WRITTEN.inc()
+
+        frames_done += 1
+        if progress_callback:
+            progress_callback(frames_done, total_frames)
+    return frames_done
+
+
+def run_pipelined(cap, out_writer, estimator, progress_callback=None, total_frames=0, queue_size=8,
+                  stride=1, summary=None):
+    """Run decode, inference, annotation and encoding on separate threads.
+
+    Stages are connected by queues holding at most ``queue_size`` frames, so
+    memory stays bounded, and each stage is a single thread consuming its
+    queue in order, so frames are written in the order they were read. The
+    first exception raised by any stage stops the pipeline and is re-raised.
+    """
+    stop = threading.Event()
+    errors = []
+    decoded = queue.Queue(maxsize=queue_size)
+    inferred = queue.Queue(maxsize=queue_size)
+    annotated = queue.Queue(maxsize=queue_size)
+    frames_done = 0
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def drain(q):
+        while not stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def decode():
+        while not stop.is_set():
+            with metrics.DECODE.time():
+                ret, frame = cap.read()
+            if not ret:
+                break
+            put(decoded, frame)
+        put(decoded, _DONE)
+
+    def infer():
+        for item in infer_frames(drain(decoded), estimator, stride, summary):
+            put(inferred, item)
+        put(inferred, _DONE)
+
+    def annotate():
+        for frame, results in drain(inferred):
+            put(annotated, estimator.annotate(frame, results) if out_writer is not None else None)
+        put(annotated, _DONE)
+
+    def encode():
+        nonlocal frames_done
+        for processed_frame in drain(annotated):
+            if processed_frame is not None and isinstance(processed_frame, np.ndarray):
+                with metrics.ENCODE.time():
+                    out_writer.write(processed_frame)
+                metrics.FRAMES_WRITTEN.inc()
+            frames_done += 1
+            if progress_callback:
+                progress_callback(frames_done, total_frames)
+
+    def guarded(stage):
+        def run():
+            try:
+                stage()
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+        return run
+
+    threads = [threading.Thread(target=guarded(stage), name=f"video-{stage.__name__}", daemon=True)
+               for stage in (decode, infer, annotate, encode)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return frames_done
@@ -12,6 +12,19 @@ export interface UploadResponse {
     result_video: string;
 }
 
+// Background processing job
+export interface JobStatus {
+    job_id: string;
+    state: 'queued' | 'running' | 'done' | 'failed';
+    progress: {
+        frames_done: number;
+        total_frames: number;
+        percent: number;
+    };
+    result_video: string | null;
+    error: string | null;
+}
+
 // Analytics Types
 export interface Analytics {
     total_vehicles: number;
@@ -61,8 +74,18 @@ export interface EmailConfigRequest {
 
 // API Functions
 
-// Upload video
-export const uploadVideo = async (file: File): Promise<UploadResponse> => {
+const JOB_POLL_INTERVAL_MS = 2000;
+
+export const getJob = async (jobId: string): Promise<JobStatus> => {
+    const response = await api.get(`/jobs/${jobId}`);
+    return response.data;
+};
+
+// Upload video and wait for the background job to finish
+export const uploadVideo = async (
+    file: File,
+    onProgress?: (job: JobStatus) => void
+): Promise<UploadResponse> => {
     const formData = new FormData();
     formData.append('file', file);
 
@@ -72,7 +95,25 @@ export const uploadVideo = async (file: File): Promise<UploadResponse> => {
         },
     });
 
-    return response.data;
+    // The same video with the same options was processed before
+    if (response.data.cached) {
+        return { message: response.data.message, result_video: response.data.result_video };
+    }
+
+    const jobId: string = response.data.job_id;
+    while (true) {
+        const job = await getJob(jobId);
+        onProgress?.(job);
+        if (job.state === 'done') {
+            return { message: 'Video processed successfully', result_video: job.result_video as string };
+        }
+        if (job.state === 'failed') {
+            throw Object.assign(new Error(job.error || 'Video processing failed'), {
+                response: { data: { error: job.error || 'Video processing failed' } },
+            });
+        }
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
 };
 
 // Analytics functions